@@ -0,0 +1,75 @@
+"""
+Collection of libraries, importable as a package with lazy loading.
+
+Importing the package costs almost nothing: each submodule (and its heavy
+dependencies like NumPy or OpenCV) is imported only when first accessed,
+either as a submodule (`libraries.image_utilities`) or through one of the
+main classes and functions re-exported here (`libraries.BitStream`).
+
+The modules don't depend on each other, so they can still be used
+standalone by adding this folder to `sys.path`.
+"""
+
+import importlib
+
+
+_SUBMODULES = (
+    "bit_stream",
+    "buffered_logger",
+    "chunking",
+    "colors",
+    "easy_opencv_trackbars",
+    "image_utilities",
+    "instrumentation",
+    "ipc_messaging",
+    "serial_relay_controller",
+    "shared_arrays",
+    "timing",
+    "useful_functions",
+)
+
+# attribute -> submodule that defines it
+_ATTRIBUTES = {
+    "BitStream": "bit_stream",
+    "MappedBitStream": "bit_stream",
+    "BitReader": "bit_stream",
+    "HuffmanCodec": "bit_stream",
+    "RangeCodec": "bit_stream",
+    "BinaryRangeCodec": "bit_stream",
+    "BufferedLogger": "buffered_logger",
+    "chunks": "chunking",
+    "parallel_map_chunks": "chunking",
+    "Palette": "colors",
+    "palette": "colors",
+    "EZTrackbars": "easy_opencv_trackbars",
+    "Mosaic": "image_utilities",
+    "Resizer": "image_utilities",
+    "Sprite": "image_utilities",
+    "TextRenderer": "image_utilities",
+    "MessageChannel": "ipc_messaging",
+    "SerialRelayBoard": "serial_relay_controller",
+    "SharedArray": "shared_arrays",
+    "SharedArrayPool": "shared_arrays",
+    "FrameRing": "shared_arrays",
+    "Ticker": "timing",
+    "TimingStats": "timing",
+    "ObjectFromDict": "useful_functions",
+    "ObjectFromJSON": "useful_functions",
+}
+
+__all__ = list(_SUBMODULES) + list(_ATTRIBUTES)
+
+
+def __getattr__(name:str):
+    if name in _SUBMODULES:
+        # the import system also stores the submodule as attribute of the package
+        return importlib.import_module("." + name, __name__)
+    if name in _ATTRIBUTES:
+        value = getattr(importlib.import_module("." + _ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -5,13 +5,29 @@ BitStream, author Michele Abruzzese, 22/08/2019
 	This class provides a way to create a stream of pure boolean
 	digits to be exported in files without the limitation of 8-bit
 	chunks that standard python methods for file writing require.
-	It's not optimized for performance but for ease of use by now.
+	Completed bytes are stored in a bytearray and the pending bits
+	are kept in an integer accumulator (flushed every 64 bits), so
+	whole fields are written with a single operation instead of bit
+	by bit. Copies and concatenations share the completed bytes as a
+	list of read-only segments (a rope) instead of copying them.
 
 	USAGE:
 	
 	{ bs = BitStream() } initializes an empty stream
 	
-	{ bs2 = BitStream(bs1) } makes a copy of another stream
+	{ bs2 = BitStream(bs1) } makes a copy of another stream (the bytes
+	already completed are shared, not copied)
+
+	{ bs = BitStream(sink=file) } binds the stream to a binary file
+	object (or a socket), completed bytes are written to it in blocks
+	of at least flush_threshold bytes (default 1 MiB) so the memory
+	used stays constant for unbounded streams. Call bs.close() at the
+	end (or use the stream as a context manager) to write the remaining
+	bytes, the last one padded with trailing zeroes. The sink itself
+	is not closed. Beware that the bytes written to the sink are gone:
+	export(), tobytes() and str() will only render the part of the
+	stream not yet written, while len() counts the whole stream, so a
+	BitReader cannot be created from a stream already flushed.
 	
 	{ bs.put(symbol) } puts the exact representation of the symbol
 	into the stream, any positive integer will be put with its
@@ -30,12 +46,29 @@ BitStream, author Michele Abruzzese, 22/08/2019
 	of multiple chars it puts each of them as ASCII binary. It works
 	also with lists of char or int, and with binary or hexadecimal forms.
 
+	{ bs.put_bits(value, nbits) } puts the non negative integer value
+	into the stream as a field of exactly nbits bits, MSB first (eg.
+	bs.put_bits(3, 5) puts '00011'). This is the fast path used by all
+	the other methods and the one to prefer for fixed-width fields.
+
+	{ bs.put_array(values, widths) } puts a whole array of codes, each
+	one as a field of the corresponding width (up to 64 bits), with the
+	same result of calling put_bits for each pair but using vectorized
+	NumPy operations. widths can be a single value for all the codes.
+	Requires NumPy.
+
 	{ bs.export() } renders the whole stream as a string, trailing zeroes
 	if not aligned with 8-bit chunks. It can be used directly to write on
 	files. Trailing zeroes will be added for each export, but the stream
 	will continue without them, so be aware when exporting in different
 	moments. It's best to export only once at the very end.
 
+	{ bs.tobytes() } same as export() but returns a bytes object.
+
+	{ len(bs) } returns the number of bits currently in the stream.
+
+	{ bs.flush() } writes the completed bytes to the sink right away.
+
 	{ bs.clear() } clears the stream deleting everything.
 
 	{ print(bs), str(bs) } will render the stream in string of 0 and 1.
@@ -49,38 +82,305 @@ BitStream, author Michele Abruzzese, 22/08/2019
 
 	{ bs2 = bs1 * 3 } repeats the stream N times
 	
-	{ bs1.concat(bs2) } append a stream at the end of another one
+	{ bs1.append(bs2) } append a stream at the end of another one
+
+	Concatenations are done at bit level: if the first stream ends on a
+	byte boundary the segments of the second one are simply linked,
+	otherwise its bytes are shifted and merged with a single big integer
+	operation. export() then joins all the segments in one pass.
+
+MappedBitStream
+
+	Variant of BitStream backed by a memory-mapped file instead of
+	memory, for streams bigger than the available RAM: the data takes
+	exactly 1 byte every 8 bits on disk and the OS keeps in memory only
+	the pages being used. The file grows in big preallocated extents
+	(default 64 MiB) and it is truncated to the real size on close().
+	It supports all the BitStream methods to write at the end of the
+	stream, plus random access reads and writes at any bit offset.
+
+	USAGE:
+
+	{ ms = MappedBitStream(path) } creates (or overwrites) the file.
+
+	{ ms = MappedBitStream(path, mode='r+') } opens an existing file
+	to read, modify or extend it. Since the file stores only bytes, nbits
+	can be given if the stream does not end on a byte boundary.
+
+	{ ms.read_bits(pos, n) } reads n bits starting at bit position pos.
+
+	{ ms.write_bits(pos, value, n) } overwrites n bits starting at bit
+	position pos (the stream is extended if needed, pos <= len(ms)).
+
+	{ ms.reader() } returns a BitReader on the mapped file itself, close
+	it before writing again since the mapping cannot grow while in use.
+
+	{ ms.flush() } writes the changes to the file on disk.
+
+	{ ms.close() } flushes, truncates and closes the file (also when
+	used as a context manager).
+
+
+BitReader
+
+	Companion class of BitStream to decode its output bit by bit (or
+	field by field) without copying the underlying buffer, so it can
+	be used on bytes, bytearray, memoryview or mmap objects of any size.
+
+	USAGE:
+
+	{ br = BitReader(buffer) } reads from any object exposing the buffer
+	interface. An optional nbits limits the readable bits (eg. to skip
+	the trailing zeroes added by export()). A BitStream (not flushed to
+	a sink) or the string returned by export() are accepted too, but
+	those are copied once.
+
+	{ br.read_bits(n) } reads the next n bits as an unsigned integer,
+	MSB first, and advances the position. Raises EOFError if there are
+	less than n bits left.
+
+	{ br.peek_bits(n) } same as read_bits(n) without advancing.
+
+	{ br.read_bit() } reads a single bit.
+
+	{ br.read_array(widths, count) } reads a whole array of fields with
+	the given widths (up to 64 bits each) as a NumPy uint64 array, it
+	is the inverse of BitStream.put_array(). If widths is a single value
+	count is the number of fields to read. Requires NumPy.
+
+	{ br.read_bytes(n) } returns a memoryview of the next n bytes, the
+	reader must be aligned to a byte boundary.
+
+	{ br.skip(n) } advances the position by n bits.
+
+	{ br.tell(), br.seek(pos, whence) } get and set the current bit
+	position, whence works as in file objects (0, 1 or 2).
+
+	{ br.align(boundary) } skips to the next multiple of boundary bits
+	(default 8), { br.is_aligned(boundary) } checks if already there.
+
+	{ br.remaining() } number of bits left to read.
+
+
+HuffmanCodec
+
+	Canonical Huffman codec for arrays of integer symbols (0, 1, 2...)
+	that writes into a BitStream and reads back from a BitReader. The
+	decoder uses a lookup table indexed by the next table_bits bits
+	(8-12 are good values) so most symbols are decoded with a single
+	lookup, longer codes fall back to the canonical first-code method.
+	Requires NumPy.
+
+	USAGE:
+
+	{ hc = HuffmanCodec.from_frequencies(freqs) } builds the codec from
+	a list/array of counts indexed by symbol, symbols with 0 count get
+	no code. Code lengths are limited to max_length bits (default 24).
+
+	{ hc = HuffmanCodec.from_symbols(symbols) } same as above counting
+	the frequencies from the array of symbols itself.
+
+	{ hc = HuffmanCodec(lengths) } builds the codec from known code
+	lengths, { huffman_code_lengths(freqs) } computes them.
+
+	{ hc.encode(symbols, bs) } puts the codes of the whole array into
+	the BitStream bs (a new one if not given) and returns it.
+
+	{ hc.decode(br, count) } decodes count symbols from the BitReader br
+	and returns them as a NumPy array.
+
+	{ hc.write_header(bs), HuffmanCodec.read_header(br) } store and
+	restore the code lengths so the stream can be decoded on its own.
+
+Universal integer codes
+
+	Self-delimiting codes for non negative integers, so that numbers of
+	any size can be written in a BitStream one after the other and read
+	back with a BitReader. All of them share the same interface, with
+	scalar methods working on Python int of any size and batched ones
+	working on NumPy uint64 arrays (batched encoding is fully vectorized,
+	LEB128 batched decoding too). Batched methods require NumPy.
+
+	EliasGammaCodec() for values >= 1, small values get short codes.
+	EliasDeltaCodec() for values >= 1, better than gamma on big values.
+	RiceCodec(k) Golomb-Rice code with parameter k (divisor 2^k), best
+	for geometric-like distributions, eg. deltas of sorted IDs or
+	timestamps. RiceCodec.from_values(values) picks the k that gives the
+	shortest output for the given values.
+	LEB128Codec() unsigned LEB128 varints (groups of 7 bits, LSB first).
+
+	USAGE (codec is any of the above):
+
+	{ codec.put(bs, value) } puts a single value into the BitStream bs.
+
+	{ codec.read(br) } reads a single value from the BitReader br.
+
+	{ codec.encode(values, bs) } puts a whole array of values into bs
+	(a new BitStream if not given) and returns it.
+
+	{ codec.decode(br, count) } reads count values as a uint64 array.
+
+Range coder
+
+	Adaptive arithmetic coding (LZMA-like range coder with carry
+	propagation) using only integer arithmetic, so the output is
+	deterministic on every platform. Unlike Huffman it does not round
+	each symbol to a whole number of bits, so it works much better on
+	skewed data like binary label streams. Bytes are written into a
+	BitStream and read back from a BitReader.
+
+	USAGE:
+
+	{ codec = BinaryRangeCodec(context_bits) } codec for arrays of bits
+	(0/1), each bit is predicted from the previous context_bits bits
+	(default 0) by an adaptive binary model.
+
+	{ codec = RangeCodec(num_symbols) } codec for arrays of symbols in
+	range 0-(num_symbols-1) with an adaptive frequency model.
+
+	{ codec.encode(symbols, bs) } puts the whole array into the
+	BitStream bs (a new one if not given) and returns it.
+
+	{ codec.decode(br, count) } decodes count symbols from the BitReader
+	br and returns them as a NumPy array.
+
+	For custom schemes (eg. mixing many models in the same stream) use
+	RangeEncoder(bs) and RangeDecoder(br) directly, with their methods
+	encode_bit(model, bit), encode_symbol(model, symbol), decode_bit(model)
+	and decode_symbol(model), on AdaptiveBinaryModel and
+	AdaptiveFrequencyModel instances. The encoder must be ended with
+	finish() and the decoder with finish() to sync the reader position.
+
+
 
 
 '''
 
+import abc
+import operator
+
+
+def _owned(segment):
+	# segments kept by a BitStream must not be views of a MappedBitStream
+	return bytes(segment) if isinstance(segment, memoryview) else segment
+
+
 class BitStream:
-	def __init__(self, other=None):
+	def __init__(self, other=None, sink=None, flush_threshold=1 << 20):
 		if other is not None:
-			self.stream = list(other.stream)
-			self.current = other.current
-			self.position = other.position
+			self._segments = [_owned(segment) for segment in other._completed_segments()]
+			self._sealed = sum(map(len, self._segments))
+			self.stream = bytearray()
+			self._acc = other._acc
+			self._nacc = other._nacc
+			self._flushed = other._flushed
 		else:
-			self.stream = []
-			self.current = 0b00000000
-			self.position = 7
+			self._segments = []	# read-only completed bytes, shared between streams
+			self._sealed = 0	# number of bytes in the segments
+			self.stream = bytearray()	# writable completed bytes after the segments
+			self._acc = 0	# pending bits, right aligned
+			self._nacc = 0	# number of pending bits, always < 64
+			self._flushed = 0	# number of bytes already written to the sink
+		self.sink = sink
+		self.flush_threshold = flush_threshold
+		if sink is not None:
+			self._write = sink.sendall if hasattr(sink, 'sendall') else sink.write
+
+	@property
+	def current(self):
+		rem = self._nacc & 7
+		return ((self._acc & ((1 << rem) - 1)) << (8 - rem)) & 0xFF
+
+	@property
+	def position(self):
+		return 7 - (self._nacc & 7)
+
+	def _flush_acc(self):
+		# moves the whole bytes of the accumulator into the stream
+		rem = self._nacc & 7
+		if self._nacc > 7:
+			self.stream += (self._acc >> rem).to_bytes(self._nacc >> 3, 'big')
+			self._acc &= (1 << rem) - 1
+			self._nacc = rem
+			if self.sink is not None and self._sealed + len(self.stream) >= self.flush_threshold:
+				self.flush()
+
+	def _seal(self):
+		# moves the writable bytes into the read-only segments, without copying them
+		if self.stream:
+			self._segments.append(self.stream)
+			self._sealed += len(self.stream)
+			self.stream = bytearray()
+
+	def _completed_segments(self):
+		# completed bytes as a list of read-only segments that can be shared
+		self._seal()
+		return self._segments
+
+	def put_bits(self, value, nbits):
+		if value.__class__ is not int or nbits.__class__ is not int:
+			value = int(value)
+			nbits = int(nbits)
+		if nbits < 0 or value < 0 or value >> nbits:
+			raise ValueError(f"value {value} does not fit in {nbits} bits")
+		self._acc = (self._acc << nbits) | value
+		self._nacc += nbits
+		if self._nacc > 63:
+			self._flush_acc()
+
+	def put_array(self, values, widths, chunk_size=1 << 16):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		values = np.asarray(values)
+		if values.dtype.kind != 'u' and np.any(values < 0):
+			# checked before the cast, that would wrap them (widths of 64 bits are not checked below)
+			raise ValueError("values cannot be negative")
+		values = values.astype(np.uint64, copy=False).ravel()
+		widths = np.broadcast_to(np.asarray(widths, dtype=np.int64), values.shape).ravel()
+		if np.any((widths < 0) | (widths > 64)):
+			raise ValueError("widths must be in range 0-64")
+		short = widths < 64
+		if np.any(values[short] >> widths[short].astype(np.uint64)):
+			raise ValueError("some values do not fit in their widths")
+		self._flush_acc()
+		for i in range(0, len(values), chunk_size):
+			# pending bits (less than 8) are merged as the first field of the chunk
+			chunk_values = np.concatenate((np.array([self._acc], dtype=np.uint64), values[i:i + chunk_size]))
+			chunk_widths = np.concatenate(([self._nacc], widths[i:i + chunk_size]))
+			ends = np.cumsum(chunk_widths)
+			total = int(ends[-1])
+			shifts = np.repeat(ends, chunk_widths) - np.arange(1, total + 1)
+			bits = ((np.repeat(chunk_values, chunk_widths) >> shifts.astype(np.uint64)) & 1).astype(np.uint8)
+			full = total & ~7
+			self.stream += np.packbits(bits[:full]).tobytes()
+			self._nacc = total - full
+			self._acc = int(np.packbits(bits[full:])[0]) >> (8 - self._nacc) if self._nacc else 0
+			if self.sink is not None and self._sealed + len(self.stream) >= self.flush_threshold:
+				self.flush()
 
 	def put(self, symbol):
-		if isinstance(symbol, str) or isinstance(symbol, list):
+		if symbol.__class__ is int and 0 <= symbol <= 1:
+			# single bits are the most common case, so they skip put_bits
+			self._acc = (self._acc << 1) | symbol
+			self._nacc += 1
+			if self._nacc > 63:
+				self._flush_acc()
+			return
+		if isinstance(symbol, str):
+			if symbol.strip('01') == '':
+				if symbol:
+					self.put_bits(int(symbol, 2), len(symbol))
+				return
 			for c in symbol:
 				self.put(int(c))
 			return
-		if symbol in [0, 1]:
-			self.current |= symbol << self.position
-			self.position -= 1
-			if (self.position < 0):
-				self.position = 7
-				self.stream.append(self.current)
-				self.current = 0b00000000
-		else:
-			symbol = bin(symbol)[2:]
+		if isinstance(symbol, list):
 			for c in symbol:
 				self.put(int(c))
+			return
+		symbol = int(symbol)
+		self.put_bits(symbol, max(1, symbol.bit_length()))
 
 	def putchar(self, char):
 		if isinstance(char, str) or isinstance(char, list):
@@ -90,54 +390,1027 @@ class BitStream:
 				return
 			else:
 				char = char[0]
-		string = bin(char if isinstance(char, int) else ord(char))
-		string = string[2:]
-		while len(string) % 8 != 0:
-			string = '0' + string
-		for c in string:
-			self.put(int(c))
-			
+		value = char if isinstance(char, int) else ord(char)
+		self.put_bits(value, max(8, (value.bit_length() + 7) & ~7))
+
+	def tobytes(self):
+		parts = list(self._completed_segments())
+		if self._nacc:
+			pad = -self._nacc & 7
+			parts.append((self._acc << pad).to_bytes((self._nacc + pad) >> 3, 'big'))
+		return b''.join(parts)
+
 	def export(self):
-		string = ""
-		for c in self.stream:
-			string += chr(c)
-		if self.position < 7:
-			string += chr(self.current)
-		return string
+		return self.tobytes().decode('latin-1')
+
+	def flush(self):
+		if self.sink is None:
+			return
+		self._seal()
+		for segment in self._segments:
+			self._write(segment)
+		self._flushed += self._sealed
+		self._segments = []
+		self._sealed = 0
+
+	def close(self):
+		if self.sink is None:
+			return
+		if self._nacc & 7:
+			self.put_bits(0, -self._nacc & 7)
+		self._flush_acc()
+		self.flush()
+		if hasattr(self.sink, 'flush'):
+			self.sink.flush()
+		self.sink = None
 
 	def clear(self):
-		self.position = 7
-		self.current = 0b00000000
-		self.stream = []
+		self._segments = []
+		self._sealed = 0
+		self.stream = bytearray()
+		self._acc = 0
+		self._nacc = 0
+		self._flushed = 0
 
 	def append(self, other):
-		self.put(other.tostr())
+		# snapshot of other before changing self, they can be the same stream
+		other._flush_acc()
+		segments = list(other._completed_segments())
+		acc, nacc = other._acc, other._nacc
+		self._flush_acc()
+		if self._nacc == 0:
+			self._seal()
+			self._segments.extend(map(_owned, segments))
+			self._sealed += sum(map(len, segments))
+		elif segments:
+			data = b''.join(segments)
+			self.put_bits(int.from_bytes(data, 'big'), 8 * len(data))
+		self.put_bits(acc, nacc)
+		if self.sink is not None and self._sealed + len(self.stream) >= self.flush_threshold:
+			self.flush()
 
 	def tostr(self):
 		return self.__str__()
 
+	def __len__(self):
+		return 8 * (self._flushed + self._sealed + len(self.stream)) + self._nacc
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
 	def __str__(self):
-		string = ""
-		for c in self.stream:
-			binary = bin(c)[2:]
-			while len(binary) < 8:
-				binary = "0" + binary
-			string += binary
-		if self.position < 7:
-			binary = bin(self.current)[2:]
-			while len(binary) < 8:
-				binary = "0" + binary
-			string += binary if self.position == 0 else binary[:-(self.position+1)]
+		data = b''.join(self._completed_segments())
+		string = format(int.from_bytes(data, 'big'), f"0{8 * len(data)}b") if data else ""
+		if self._nacc:
+			string += format(self._acc, f"0{self._nacc}b")
 		return string
 
 	def __add__(self, other):
-		bs = BitStream()
-		bs.put(self.tostr() + other.tostr())
+		bs = BitStream(self)
+		bs.append(other)
 		return bs
 
 	def __mul__(self, num):
 		bs = BitStream()
-		string = self.tostr()
 		for _ in range(num):
-			bs.put(string)
-		return bs
\ No newline at end of file
+			bs.append(self)
+		return bs
+
+
+class MappedBitStream(BitStream):
+	def __init__(self, path, mode='w', nbits=None, extent=1 << 26):
+		# IMPORTS ########
+		import os
+		##################
+		super().__init__()
+		if mode not in ('w', 'r+'):
+			raise ValueError("mode must be 'w' or 'r+'")
+		self.path = path
+		self.extent = extent
+		self._file = open(path, 'w+b' if mode == 'w' else 'r+b')
+		file_size = os.fstat(self._file.fileno()).st_size
+		if nbits is None:
+			nbits = 8 * file_size
+		elif not (0 <= nbits <= 8 * file_size):
+			raise ValueError(f"nbits must be in range 0-{8 * file_size}")
+		self._size = nbits >> 3	# number of completed bytes in the file
+		self._mm = None
+		self._map(max(file_size, 1))
+		if nbits & 7:
+			self._nacc = nbits & 7
+			self._acc = self._mm[self._size] >> (8 - self._nacc)
+
+	def _map(self, size):
+		# IMPORTS ########
+		import mmap
+		##################
+		capacity = -(-size // self.extent) * self.extent
+		if self._mm is not None:
+			self._mm.close()
+		self._file.truncate(capacity)
+		self._mm = mmap.mmap(self._file.fileno(), capacity)
+
+	def _ensure(self, size):
+		if size > len(self._mm):
+			self._map(size)
+
+	def _flush_acc(self):
+		rem = self._nacc & 7
+		if self._nacc > 7:
+			count = self._nacc >> 3
+			self._ensure(self._size + count + 1)
+			self._mm[self._size:self._size + count] = (self._acc >> rem).to_bytes(count, 'big')
+			self._size += count
+			self._acc &= (1 << rem) - 1
+			self._nacc = rem
+
+	def _completed_segments(self):
+		# a view of the mapping, not a copy: the file can be bigger than the RAM
+		return [memoryview(self._mm)[:self._size]]
+
+	def _write_pending(self):
+		# stores the pending bits in the file, padded, without completing the byte
+		self._flush_acc()
+		if self._nacc:
+			self._ensure(self._size + 1)
+			self._mm[self._size] = self.current
+
+	def put_array(self, values, widths, chunk_size=1 << 16):
+		self._flush_acc()
+		bs = BitStream()
+		bs._acc, bs._nacc = self._acc, self._nacc
+		bs.put_array(values, widths, chunk_size)
+		self._acc, self._nacc = 0, 0
+		self.append(bs)
+
+	def append(self, other):
+		# snapshot of other before changing self, they can be the same stream
+		other._flush_acc()
+		self._flush_acc()
+		# the mapping is grown in advance, it cannot be remapped while other is viewed
+		self._ensure(self._size + (len(other) >> 3) + 2)
+		segments = list(other._completed_segments())
+		acc, nacc = other._acc, other._nacc
+		if self._nacc == 0:
+			for segment in segments:
+				self._mm[self._size:self._size + len(segment)] = segment
+				self._size += len(segment)
+			data = None
+		else:
+			data = b''.join(segments)
+		for segment in segments:
+			if isinstance(segment, memoryview):
+				segment.release()
+		if data:
+			self.put_bits(int.from_bytes(data, 'big'), 8 * len(data))
+		self.put_bits(acc, nacc)
+
+	def read_bits(self, pos, nbits):
+		end = pos + nbits
+		if pos < 0 or nbits < 0:
+			raise ValueError("position and number of bits cannot be negative")
+		if end > len(self):
+			raise EOFError(f"cannot read up to bit {end}, the stream has {len(self)} bits")
+		if nbits == 0:
+			return 0
+		self._write_pending()
+		stop = (end + 7) >> 3
+		chunk = int.from_bytes(self._mm[pos >> 3:stop], 'big')
+		return (chunk >> ((stop << 3) - end)) & ((1 << nbits) - 1)
+
+	def write_bits(self, pos, value, nbits):
+		length = len(self)
+		if not (0 <= pos <= length):
+			raise ValueError(f"position {pos} out of range 0-{length}")
+		if nbits < 0 or value < 0 or value >> nbits:
+			raise ValueError(f"value {value} does not fit in {nbits} bits")
+		overwrite = min(nbits, length - pos)
+		if overwrite > 0:
+			self._write_pending()
+			end = pos + overwrite
+			start, stop = pos >> 3, (end + 7) >> 3
+			shift = (stop << 3) - end
+			mask = ((1 << overwrite) - 1) << shift
+			old = int.from_bytes(self._mm[start:stop], 'big')
+			new = ((old & ~mask) | ((value >> (nbits - overwrite)) << shift)).to_bytes(stop - start, 'big')
+			self._mm[start:stop] = new
+			if stop > self._size:
+				self._acc = new[-1] >> (8 - self._nacc)
+		if nbits > overwrite:
+			self.put_bits(value & ((1 << (nbits - overwrite)) - 1), nbits - overwrite)
+
+	def reader(self):
+		self._write_pending()
+		return BitReader(memoryview(self._mm)[:self._size + (1 if self._nacc else 0)], len(self))
+
+	def tobytes(self):
+		self._write_pending()
+		return self._mm[:self._size + (1 if self._nacc else 0)]
+
+	def flush(self):
+		self._write_pending()
+		self._mm.flush()
+
+	def close(self):
+		if self._file.closed:
+			return
+		self._write_pending()
+		size = self._size + (1 if self._nacc else 0)
+		self._mm.flush()
+		self._mm.close()
+		self._file.truncate(size)
+		self._file.close()
+
+	def clear(self):
+		self._size = 0
+		self._acc = 0
+		self._nacc = 0
+
+	def __len__(self):
+		return 8 * self._size + self._nacc
+
+	def __add__(self, other):
+		bs = BitStream()
+		bs.append(self)
+		bs.append(other)
+		return bs
+
+
+class BitReader:
+	def __init__(self, buffer, nbits=None):
+		if isinstance(buffer, BitStream):
+			if buffer._flushed:
+				raise ValueError("part of the stream was flushed to its sink, read it from the sink instead")
+			nbits = len(buffer) if nbits is None else nbits
+			buffer = buffer.tobytes()
+		elif isinstance(buffer, str):
+			buffer = buffer.encode('latin-1')
+		self._view = memoryview(buffer).cast('B')
+		size = 8 * len(self._view)
+		if nbits is None:
+			nbits = size
+		elif not (0 <= nbits <= size):
+			raise ValueError(f"nbits must be in range 0-{size}")
+		self.nbits = nbits
+		self._pos = 0
+
+	def peek_bits(self, n):
+		if n < 0:
+			raise ValueError("number of bits cannot be negative")
+		end = self._pos + n
+		if end > self.nbits:
+			raise EOFError(f"cannot read {n} bits, only {self.nbits - self._pos} left")
+		if n == 0:
+			return 0
+		stop = (end + 7) >> 3
+		chunk = int.from_bytes(self._view[self._pos >> 3:stop], 'big')
+		return (chunk >> ((stop << 3) - end)) & ((1 << n) - 1)
+
+	def read_bits(self, n):
+		value = self.peek_bits(n)
+		self._pos += n
+		return value
+
+	def read_bit(self):
+		pos = self._pos
+		if pos >= self.nbits:
+			raise EOFError("no bits left")
+		self._pos = pos + 1
+		return (self._view[pos >> 3] >> (7 - (pos & 7))) & 1
+
+	def read_array(self, widths, count=None, chunk_size=1 << 16):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		widths = np.asarray(widths, dtype=np.int64)
+		if widths.ndim == 0:
+			if count is None:
+				raise ValueError("count is required when widths is a single value")
+			widths = np.full(count, widths, dtype=np.int64)
+		widths = widths.ravel()
+		if np.any((widths < 0) | (widths > 64)):
+			raise ValueError("widths must be in range 0-64")
+		if self._pos + int(widths.sum()) > self.nbits:
+			raise EOFError(f"cannot read {int(widths.sum())} bits, only {self.remaining()} left")
+		out = np.zeros(len(widths), dtype=np.uint64)
+		for i in range(0, len(widths), chunk_size):
+			chunk_widths = widths[i:i + chunk_size]
+			ends = np.cumsum(chunk_widths)
+			total = int(ends[-1])
+			if total == 0:
+				continue
+			start, stop = self._pos >> 3, (self._pos + total + 7) >> 3
+			offset = self._pos & 7
+			bits = np.unpackbits(np.frombuffer(self._view[start:stop], dtype=np.uint8))[offset:offset + total]
+			shifts = np.repeat(ends, chunk_widths) - np.arange(1, total + 1)
+			weighted = bits.astype(np.uint64) << shifts.astype(np.uint64)
+			starts = ends - chunk_widths
+			nonempty = chunk_widths > 0
+			out[i:i + chunk_size][nonempty] = np.bitwise_or.reduceat(weighted, starts[nonempty])
+			self._pos += total
+		return out
+
+	def read_bytes(self, n):
+		if self._pos & 7:
+			raise ValueError("reader is not aligned to a byte boundary")
+		if self._pos + 8 * n > self.nbits:
+			raise EOFError(f"cannot read {n} bytes, only {self.remaining()} bits left")
+		start = self._pos >> 3
+		self._pos += 8 * n
+		return self._view[start:start + n]
+
+	def skip(self, n):
+		self.seek(n, 1)
+
+	def tell(self):
+		return self._pos
+
+	def seek(self, pos, whence=0):
+		if whence == 1:
+			pos += self._pos
+		elif whence == 2:
+			pos += self.nbits
+		elif whence != 0:
+			raise ValueError("whence must be 0, 1 or 2")
+		if not (0 <= pos <= self.nbits):
+			raise ValueError(f"position {pos} out of range 0-{self.nbits}")
+		self._pos = pos
+		return pos
+
+	def is_aligned(self, boundary=8):
+		return self._pos % boundary == 0
+
+	def align(self, boundary=8):
+		return self.seek(min(self.nbits, -(-self._pos // boundary) * boundary))
+
+	def remaining(self):
+		return self.nbits - self._pos
+
+	def close(self):
+		self._view.release()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+def huffman_code_lengths(frequencies, max_length=24):
+	if not (1 <= max_length <= 32):
+		raise ValueError("max_length must be in range 1-32")
+	# IMPORTS ########
+	import heapq
+	##################
+	frequencies = [int(f) for f in frequencies]
+	lengths = [0] * len(frequencies)
+	used = [i for i, f in enumerate(frequencies) if f > 0]
+	if len(used) == 1:
+		lengths[used[0]] = 1
+	if len(used) < 2:
+		return lengths
+	if len(used) > 1 << max_length:
+		raise ValueError(f"{len(used)} symbols cannot have codes of at most {max_length} bits")
+	while True:
+		# each heap node is (weight, tiebreak, list of symbols below it)
+		heap = [(frequencies[i], i, [i]) for i in used]
+		heapq.heapify(heap)
+		for i in used:
+			lengths[i] = 0
+		while len(heap) > 1:
+			w1, t1, s1 = heapq.heappop(heap)
+			w2, t2, s2 = heapq.heappop(heap)
+			for i in s1:
+				lengths[i] += 1
+			for i in s2:
+				lengths[i] += 1
+			heapq.heappush(heap, (w1 + w2, min(t1, t2), s1 + s2))
+		if max(lengths) <= max_length:
+			return lengths
+		# flatten the distribution and retry until the limit is respected
+		frequencies = [(f + 1) // 2 if f > 0 else 0 for f in frequencies]
+
+
+class HuffmanCodec:
+	def __init__(self, lengths, table_bits=10):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		self.lengths = np.asarray(lengths, dtype=np.int64)
+		if np.any((self.lengths < 0) | (self.lengths > 32)):
+			raise ValueError("code lengths must be in range 0-32")
+		self.max_length = int(self.lengths.max(initial=0))
+		self.table_bits = table_bits
+
+		# canonical codes, assigned in order of (length, symbol)
+		order = [i for i in np.lexsort((np.arange(len(self.lengths)), self.lengths)) if self.lengths[i] > 0]
+		self.codes = np.zeros(len(self.lengths), dtype=np.uint64)
+		self._sorted_symbols = order
+		self._first_code = [0] * (self.max_length + 2)
+		self._first_index = [0] * (self.max_length + 2)
+		self._count = [0] * (self.max_length + 2)
+		code = 0
+		prev_length = 0
+		for index, symbol in enumerate(order):
+			length = int(self.lengths[symbol])
+			code <<= length - prev_length
+			if length != prev_length:
+				self._first_code[length] = code
+				self._first_index[length] = index
+			if code >> length:
+				raise ValueError("code lengths do not describe a valid prefix code")
+			self.codes[symbol] = code
+			self._count[length] += 1
+			code += 1
+			prev_length = length
+
+		# lookup table indexed by the next table_bits bits of the stream
+		self._table_symbol = [0] * (1 << table_bits)
+		self._table_length = [0] * (1 << table_bits)
+		for symbol in order:
+			length = int(self.lengths[symbol])
+			if length > table_bits:
+				break
+			shift = table_bits - length
+			start = int(self.codes[symbol]) << shift
+			for i in range(start, start + (1 << shift)):
+				self._table_symbol[i] = symbol
+				self._table_length[i] = length
+
+	@classmethod
+	def from_frequencies(cls, frequencies, max_length=24, table_bits=10):
+		return cls(huffman_code_lengths(frequencies, max_length), table_bits)
+
+	@classmethod
+	def from_symbols(cls, symbols, max_length=24, table_bits=10):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		return cls.from_frequencies(np.bincount(np.asarray(symbols).ravel()), max_length, table_bits)
+
+	@classmethod
+	def read_header(cls, reader, table_bits=10):
+		num_symbols = reader.read_bits(16)
+		return cls(reader.read_array(6, num_symbols), table_bits)
+
+	def write_header(self, bs):
+		if len(self.lengths) >= 1 << 16:
+			raise ValueError("too many symbols to be stored in the header")
+		bs.put_bits(len(self.lengths), 16)
+		bs.put_array(self.lengths, 6)
+
+	def encode(self, symbols, bs=None):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		bs = BitStream() if bs is None else bs
+		symbols = np.asarray(symbols).ravel()
+		if symbols.size and (symbols.min() < 0 or symbols.max() >= len(self.lengths)):
+			raise ValueError("some symbols are out of the range of the code")
+		lengths = self.lengths[symbols]
+		if np.any(lengths == 0):
+			raise ValueError("some symbols have no code")
+		bs.put_array(self.codes[symbols], lengths)
+		return bs
+
+	def decode(self, reader, count):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		table_bits = self.table_bits
+		table_mask = (1 << table_bits) - 1
+		table_symbol = self._table_symbol
+		table_length = self._table_length
+		view = reader._view
+		size = len(view)
+		start = reader.tell()
+		byte = start >> 3
+		# bit buffer, refilled 7 bytes at a time and padded with zeroes past the end
+		acc = view[byte] & (0xFF >> (start & 7)) if byte < size else 0
+		nacc = 8 - (start & 7)
+		byte += 1
+		out = [0] * count
+		for i in range(count):
+			if nacc < 57:
+				acc = ((acc & ((1 << nacc) - 1)) << 56) | int.from_bytes(view[byte:byte + 7].tobytes().ljust(7, b'\0'), 'big')
+				nacc += 56
+				byte += 7
+			index = (acc >> (nacc - table_bits)) & table_mask
+			length = table_length[index]
+			if length:
+				out[i] = table_symbol[index]
+				nacc -= length
+				continue
+			# slow path for codes longer than table_bits
+			code = index
+			length = table_bits
+			while True:
+				length += 1
+				if length > self.max_length:
+					raise ValueError("invalid code in the stream")
+				code = (code << 1) | ((acc >> (nacc - length)) & 1)
+				offset = code - self._first_code[length]
+				if 0 <= offset < self._count[length]:
+					out[i] = self._sorted_symbols[self._first_index[length] + offset]
+					nacc -= length
+					break
+		end = 8 * byte - nacc
+		if end > reader.nbits:
+			reader.seek(reader.nbits)
+			raise EOFError(f"stream ended before decoding {count} symbols")
+		reader.seek(end)
+		return np.array(out, dtype=np.int64)
+
+
+def _bit_length(values):
+	# vectorized int.bit_length() for uint64 arrays
+	# IMPORTS ########
+	import numpy as np
+	##################
+	values = values.copy()
+	lengths = np.zeros(values.shape, dtype=np.int64)
+	for shift in (32, 16, 8, 4, 2, 1):
+		big = values >= np.uint64(1 << shift)
+		lengths[big] += shift
+		values[big] >>= np.uint64(shift)
+	return lengths + (values > 0)
+
+
+class _BitBuffer:
+	# local bit buffer used by the decoders of the universal codes,
+	# refilled 16 bytes at a time and padded with zeroes past the end
+	def __init__(self, reader):
+		self.reader = reader
+		self.view = reader._view
+		start = reader.tell()
+		self.byte = start >> 3
+		self.acc = self.view[self.byte] & (0xFF >> (start & 7)) if self.byte < len(self.view) else 0
+		self.nacc = 8 - (start & 7)
+		self.byte += 1
+
+	def _refill(self):
+		chunk = self.view[self.byte:self.byte + 16].tobytes().ljust(16, b'\0')
+		self.acc = ((self.acc & ((1 << self.nacc) - 1)) << 128) | int.from_bytes(chunk, 'big')
+		self.nacc += 128
+		self.byte += 16
+
+	def read_bits(self, n):
+		while self.nacc < n:
+			self._refill()
+		self.nacc -= n
+		return (self.acc >> self.nacc) & ((1 << n) - 1)
+
+	def read_zeros(self):
+		# consumes the zeroes up to the next 1 (not included) and counts them
+		zeros = 0
+		while True:
+			rest = self.acc & ((1 << self.nacc) - 1)
+			if rest:
+				break
+			if self.byte >= len(self.view):
+				raise EOFError("stream ended while reading a code")
+			zeros += self.nacc
+			self.nacc = 0
+			self._refill()
+		rest = self.nacc - rest.bit_length()
+		self.nacc -= rest
+		return zeros + rest
+
+	def close(self):
+		end = 8 * self.byte - self.nacc
+		if end > self.reader.nbits:
+			self.reader.seek(self.reader.nbits)
+			raise EOFError("stream ended while reading a code")
+		self.reader.seek(end)
+
+
+class _UniversalCodec(abc.ABC):
+	@abc.abstractmethod
+	def put(self, bs, value):
+		pass
+
+	@abc.abstractmethod
+	def _read(self, buffer):
+		pass
+
+	@abc.abstractmethod
+	def _fields(self, values):
+		pass
+
+	def read(self, reader):
+		buffer = _BitBuffer(reader)
+		value = self._read(buffer)
+		buffer.close()
+		return value
+
+	def decode(self, reader, count):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		buffer = _BitBuffer(reader)
+		read = self._read
+		out = [read(buffer) for _ in range(count)]
+		buffer.close()
+		return np.array(out, dtype=np.uint64)
+
+	def encode(self, values, bs=None):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		bs = BitStream() if bs is None else bs
+		values = np.asarray(values).ravel()
+		if values.size and values.min() < 0:
+			raise ValueError("values cannot be negative")
+		fields, widths = self._fields(values.astype(np.uint64))
+		bs.put_array(fields, widths)
+		return bs
+
+
+class EliasGammaCodec(_UniversalCodec):
+	def put(self, bs, value):
+		# accepts NumPy integers too, but not floats
+		value = operator.index(value)
+		if value < 1:
+			raise ValueError("Elias gamma code requires values >= 1")
+		bs.put_bits(value, 2 * value.bit_length() - 1)
+
+	def _read(self, buffer):
+		zeros = buffer.read_zeros()
+		return buffer.read_bits(zeros + 1)
+
+	def _fields(self, values):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		if np.any(values == 0):
+			raise ValueError("Elias gamma code requires values >= 1")
+		lengths = _bit_length(values)
+		fields = np.stack((np.zeros_like(values), values), axis=1).ravel()
+		widths = np.stack((lengths - 1, lengths), axis=1).ravel()
+		return fields, widths
+
+
+class EliasDeltaCodec(_UniversalCodec):
+	def put(self, bs, value):
+		# accepts NumPy integers too, but not floats
+		value = operator.index(value)
+		if value < 1:
+			raise ValueError("Elias delta code requires values >= 1")
+		length = value.bit_length()
+		bs.put_bits(length, 2 * length.bit_length() - 1)
+		bs.put_bits(value ^ (1 << (length - 1)), length - 1)
+
+	def _read(self, buffer):
+		zeros = buffer.read_zeros()
+		length = buffer.read_bits(zeros + 1)
+		return (1 << (length - 1)) | buffer.read_bits(length - 1)
+
+	def _fields(self, values):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		if np.any(values == 0):
+			raise ValueError("Elias delta code requires values >= 1")
+		lengths = _bit_length(values)
+		prefix = 2 * _bit_length(lengths.astype(np.uint64)) - 1
+		rest = values ^ (np.uint64(1) << (lengths - 1).astype(np.uint64))
+		fields = np.stack((lengths.astype(np.uint64), rest), axis=1).ravel()
+		widths = np.stack((prefix, lengths - 1), axis=1).ravel()
+		return fields, widths
+
+
+class RiceCodec(_UniversalCodec):
+	def __init__(self, k):
+		if not (0 <= k <= 63):
+			raise ValueError("parameter k must be in range 0-63")
+		self.k = k
+
+	@staticmethod
+	def optimal_parameter(values):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		values = np.asarray(values).astype(np.uint64).ravel()
+		best_k, best_size = 0, None
+		for k in range(64):
+			size = int(np.sum(values >> np.uint64(k), dtype=np.uint64)) + len(values) * (k + 1)
+			if best_size is not None and size >= best_size:
+				break
+			best_k, best_size = k, size
+		return best_k
+
+	@classmethod
+	def from_values(cls, values):
+		return cls(cls.optimal_parameter(values))
+
+	def put(self, bs, value):
+		# accepts NumPy integers too, but not floats
+		value = operator.index(value)
+		if value < 0:
+			raise ValueError("values cannot be negative")
+		bs.put_bits(1, (value >> self.k) + 1)
+		bs.put_bits(value & ((1 << self.k) - 1), self.k)
+
+	def _read(self, buffer):
+		quotient = buffer.read_zeros()
+		return (quotient << self.k) | buffer.read_bits(self.k + 1) & ((1 << self.k) - 1)
+
+	def _fields(self, values):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		k = np.uint64(self.k)
+		quotients = values >> k
+		if quotients.size and quotients.max() > 63:
+			raise ValueError(f"values too big for k = {self.k}, use a bigger k")
+		fields = np.stack((np.ones_like(values), values & ((np.uint64(1) << k) - np.uint64(1))), axis=1).ravel()
+		widths = np.stack((quotients.astype(np.int64) + 1, np.full(len(values), self.k)), axis=1).ravel()
+		return fields, widths
+
+
+class LEB128Codec(_UniversalCodec):
+	def put(self, bs, value):
+		# accepts NumPy integers too, but not floats
+		value = operator.index(value)
+		if value < 0:
+			raise ValueError("values cannot be negative")
+		while value > 0x7F:
+			bs.put_bits(0x80 | (value & 0x7F), 8)
+			value >>= 7
+		bs.put_bits(value, 8)
+
+	def _read(self, buffer):
+		value = 0
+		shift = 0
+		while True:
+			byte = buffer.read_bits(8)
+			value |= (byte & 0x7F) << shift
+			if byte < 0x80:
+				return value
+			shift += 7
+
+	def _fields(self, values):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		groups = np.maximum(1, (_bit_length(values) + 6) // 7)
+		owner = np.repeat(np.arange(len(values)), groups)
+		index = np.arange(len(owner)) - np.repeat(np.cumsum(groups) - groups, groups)
+		fields = (values[owner] >> (7 * index).astype(np.uint64)) & np.uint64(0x7F)
+		fields[index < groups[owner] - 1] |= np.uint64(0x80)
+		return fields, 8
+
+	def decode(self, reader, count, chunk_size=1 << 16):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		out = np.empty(count, dtype=np.uint64)
+		done = 0
+		carry = np.empty(0, dtype=np.uint64)	# bytes of a value split across chunks
+		while done < count:
+			available = reader.remaining() >> 3
+			if available == 0:
+				raise EOFError("stream ended while reading a code")
+			start = reader.tell()
+			data = np.concatenate((carry, reader.read_array(8, min(available, chunk_size))))
+			ends = np.flatnonzero(data < 0x80)[:count - done]
+			if len(ends) == 0:
+				carry = data
+				continue
+			used = int(ends[-1]) + 1
+			reader.seek(start + 8 * (used - len(carry)))
+			data = data[:used]
+			groups = np.diff(ends, prepend=-1)
+			if groups.max() > 10:
+				raise ValueError("LEB128 value bigger than 64 bits")
+			index = np.arange(used) - np.repeat(ends + 1 - groups, groups)
+			weighted = (data & np.uint64(0x7F)) << (7 * index).astype(np.uint64)
+			out[done:done + len(ends)] = np.bitwise_or.reduceat(weighted, ends + 1 - groups)
+			done += len(ends)
+			carry = np.empty(0, dtype=np.uint64)
+		return out
+
+
+class AdaptiveBinaryModel:
+	# probabilities of a 0 bit in 1/2048 units, one for each context
+	def __init__(self, context_bits=0, shift=4):
+		self.probs = [1024] * (1 << context_bits)
+		self.context = 0
+		self.context_mask = (1 << context_bits) - 1
+		self.shift = shift
+
+
+class AdaptiveFrequencyModel:
+	# symbol frequencies kept in a Fenwick tree for O(log n) updates and lookups
+	def __init__(self, num_symbols, increment=32, limit=1 << 16):
+		if not (1 <= num_symbols < limit):
+			raise ValueError(f"num_symbols must be in range 1-{limit - 1}")
+		if limit > 1 << 16:
+			raise ValueError("limit cannot be bigger than 2^16")
+		self.num_symbols = num_symbols
+		self.increment = increment
+		self.limit = limit
+		self._rebuild([1] * num_symbols)
+
+	def _rebuild(self, frequencies):
+		self.frequencies = frequencies
+		self.total = sum(frequencies)
+		self.tree = [0] + frequencies
+		for i in range(1, self.num_symbols + 1):
+			parent = i + (i & -i)
+			if parent <= self.num_symbols:
+				self.tree[parent] += self.tree[i]
+		self._top = 1 << (self.num_symbols.bit_length() - 1)
+
+	def cumulative(self, symbol):
+		total = 0
+		while symbol > 0:
+			total += self.tree[symbol]
+			symbol &= symbol - 1
+		return total
+
+	def find(self, value):
+		# returns the symbol whose cumulative range contains value, and its cumulative frequency
+		position = 0
+		step = self._top
+		tree = self.tree
+		while step:
+			if position + step <= self.num_symbols and tree[position + step] <= value:
+				position += step
+				value -= tree[position]
+			step >>= 1
+		return position, self.cumulative(position)
+
+	def update(self, symbol):
+		self.frequencies[symbol] += self.increment
+		self.total += self.increment
+		if self.total > self.limit:
+			self._rebuild([(f + 1) >> 1 for f in self.frequencies])
+			return
+		i = symbol + 1
+		while i <= self.num_symbols:
+			self.tree[i] += self.increment
+			i += i & -i
+
+
+class RangeEncoder:
+	def __init__(self, bs=None):
+		self.bs = BitStream() if bs is None else bs
+		self.low = 0
+		self.range = 0xFFFFFFFF
+		self.cache = 0
+		self.cache_size = 1
+		self.out = bytearray()
+
+	def _shift_low(self):
+		if self.low < 0xFF000000 or self.low > 0xFFFFFFFF:
+			carry = self.low >> 32
+			temp = self.cache
+			while True:
+				self.out.append((temp + carry) & 0xFF)
+				temp = 0xFF
+				self.cache_size -= 1
+				if self.cache_size == 0:
+					break
+			self.cache = (self.low >> 24) & 0xFF
+		self.cache_size += 1
+		self.low = (self.low & 0x00FFFFFF) << 8
+
+	def encode_bit(self, model, bit):
+		context = model.context
+		prob = model.probs[context]
+		bound = (self.range >> 11) * prob
+		if bit:
+			self.low += bound
+			self.range -= bound
+			model.probs[context] = prob - (prob >> model.shift)
+		else:
+			self.range = bound
+			model.probs[context] = prob + ((2048 - prob) >> model.shift)
+		model.context = ((context << 1) | bit) & model.context_mask
+		while self.range < 0x01000000:
+			self.range <<= 8
+			self._shift_low()
+
+	def encode_symbol(self, model, symbol):
+		r = self.range // model.total
+		self.low += r * model.cumulative(symbol)
+		self.range = r * model.frequencies[symbol]
+		model.update(symbol)
+		while self.range < 0x01000000:
+			self.range <<= 8
+			self._shift_low()
+
+	def finish(self):
+		for _ in range(5):
+			self._shift_low()
+		if self.out:
+			self.bs.put_bits(int.from_bytes(self.out, 'big'), 8 * len(self.out))
+		self.out = bytearray()
+		return self.bs
+
+
+class RangeDecoder:
+	def __init__(self, reader):
+		self._buffer = _BitBuffer(reader)
+		self.range = 0xFFFFFFFF
+		self.code = self._buffer.read_bits(40)
+
+	def decode_bit(self, model):
+		context = model.context
+		prob = model.probs[context]
+		bound = (self.range >> 11) * prob
+		if self.code < bound:
+			self.range = bound
+			model.probs[context] = prob + ((2048 - prob) >> model.shift)
+			bit = 0
+		else:
+			self.code -= bound
+			self.range -= bound
+			model.probs[context] = prob - (prob >> model.shift)
+			bit = 1
+		model.context = ((context << 1) | bit) & model.context_mask
+		while self.range < 0x01000000:
+			self.range <<= 8
+			self.code = (self.code << 8) | self._buffer.read_bits(8)
+		return bit
+
+	def decode_symbol(self, model):
+		r = self.range // model.total
+		symbol, cumulative = model.find(min(self.code // r, model.total - 1))
+		self.code -= r * cumulative
+		self.range = r * model.frequencies[symbol]
+		model.update(symbol)
+		while self.range < 0x01000000:
+			self.range <<= 8
+			self.code = (self.code << 8) | self._buffer.read_bits(8)
+		return symbol
+
+	def finish(self):
+		self._buffer.close()
+
+
+class BinaryRangeCodec:
+	def __init__(self, context_bits=0, shift=4):
+		self.context_bits = context_bits
+		self.shift = shift
+
+	def encode(self, bits, bs=None):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		bits = np.asarray(bits).ravel()
+		if bits.size and (bits.min() < 0 or bits.max() > 1):
+			raise ValueError("only 0 and 1 can be encoded")
+		model = AdaptiveBinaryModel(self.context_bits, self.shift)
+		encoder = RangeEncoder(bs)
+		encode_bit = encoder.encode_bit
+		for bit in bits.tolist():
+			encode_bit(model, bit)
+		return encoder.finish()
+
+	def decode(self, reader, count):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		model = AdaptiveBinaryModel(self.context_bits, self.shift)
+		decoder = RangeDecoder(reader)
+		decode_bit = decoder.decode_bit
+		out = [decode_bit(model) for _ in range(count)]
+		decoder.finish()
+		return np.array(out, dtype=np.uint8)
+
+
+class RangeCodec:
+	def __init__(self, num_symbols, increment=32, limit=1 << 16):
+		self.num_symbols = num_symbols
+		self.increment = increment
+		self.limit = limit
+
+	def encode(self, symbols, bs=None):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		symbols = np.asarray(symbols).ravel()
+		if symbols.size and (symbols.min() < 0 or symbols.max() >= self.num_symbols):
+			raise ValueError(f"symbols must be in range 0-{self.num_symbols - 1}")
+		model = AdaptiveFrequencyModel(self.num_symbols, self.increment, self.limit)
+		encoder = RangeEncoder(bs)
+		encode_symbol = encoder.encode_symbol
+		for symbol in symbols.tolist():
+			encode_symbol(model, symbol)
+		return encoder.finish()
+
+	def decode(self, reader, count):
+		# IMPORTS ########
+		import numpy as np
+		##################
+		model = AdaptiveFrequencyModel(self.num_symbols, self.increment, self.limit)
+		decoder = RangeDecoder(reader)
+		decode_symbol = decoder.decode_symbol
+		out = [decode_symbol(model) for _ in range(count)]
+		decoder.finish()
+		return np.array(out, dtype=np.int64)
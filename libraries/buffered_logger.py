@@ -0,0 +1,250 @@
+"""
+Buffered logging in background, a drop-in replacement of
+`useful_functions.logged_print` for hot paths.
+
+`BufferedLogger` prints lines with the same `[ timestamp ] [ tag ] message`
+format of `logged_print`, but the caller only takes the time, formats the
+message and appends it to a queue (a `collections.deque`, whose appends
+don't need locks): the timestamps are formatted and the lines written in
+batches by a background thread. The timestamp prefix is cached at
+millisecond resolution, so `strftime` runs at most once per millisecond,
+each tag can be rate limited and the queue is flushed at exit.
+
+The module-level `logged_print` uses a shared default logger and has the
+same signature of the original one.
+"""
+
+import atexit
+import collections
+import datetime
+import sys
+import threading
+import time
+
+
+class BufferedLogger:
+    """
+    Logger that writes `[ timestamp ] [ tag ] message` lines in batches from
+    a background thread
+
+    Notes
+    -----
+    Messages are converted to strings when logged, while timestamps are
+    taken when logged but formatted when written, at millisecond resolution
+    (`%f` shows the milliseconds followed by 000). Lines are written in the
+    order they are logged
+    """
+
+    def __init__(self, file=None, just:int=8, time_format:str="%Y-%m-%d %H:%M:%S.%f", interval:float=0.05,
+                 batch_size:int=256, rate_limits:dict=None, default_rate_limit:float=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        file : file_like or None
+            default destination of the lines, None for the current sys.stdout
+        just : int
+            default min size of tag field, adds padding if `len(tag) < just`
+        time_format : str
+            default format of the timestamp field (see `datetime.strftime`)
+        interval : float
+            max seconds between two batched writes
+        batch_size : int
+            number of queued lines that wakes up the writer before `interval`
+        rate_limits : dict or None
+            max number of lines per second for some tags ({tag: rate}),
+            exceeding lines are dropped and their number is reported
+        default_rate_limit : float or None
+            max number of lines per second for the tags not in rate_limits,
+            None for no limit
+        """
+        self.file = file
+        self.just = just
+        self.time_format = time_format
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rate_limits = dict(rate_limits or {})
+        self.default_rate_limit = default_rate_limit
+        self._buckets = {}      # tag -> [tokens, last refill time, dropped lines]
+        self._queue = collections.deque()
+        self._prefixes = {}     # time_format -> (second, strftime of the parts around %f, millisecond, prefix)
+        self._wake = threading.Event()
+        self._closed = False
+        self._draining = False
+        self._thread = threading.Thread(target=self._run, name="BufferedLogger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # LOGGING ######################################################
+
+    def _allow(self, tag) -> int:
+        """
+        Token bucket of a tag, returns -1 if the line must be dropped else the
+        number of lines dropped since the last allowed one
+        """
+        rate = self.rate_limits.get(tag, self.default_rate_limit)
+        if rate is None:
+            return 0
+        now = time.monotonic()
+        bucket = self._buckets.get(tag)
+        if bucket is None:
+            bucket = self._buckets[tag] = [rate, now, 0]
+        else:
+            # bursts up to one second of lines
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return -1
+        bucket[0] -= 1
+        dropped = bucket[2]
+        bucket[2] = 0
+        return dropped
+
+    def log(self, *args, tag:str=None, just:int=None, time_format:str=None, sep:str=" ", end:str="\n", file=None,
+            flush:bool=False) -> None:
+        """
+        Logs a line in the format `[ timestamp ] [ tag ] message`
+
+        Parameters
+        ----------
+        tag : str or None
+            the tag to be used in `[ tag ]` if present
+        just : int or None
+            min size of tag field, None for the default of the logger
+        time_format : str or None
+            format of the timestamp field, None for the default of the logger
+        sep, end, file :
+            same as `print`, file None for the default of the logger
+        flush : bool
+            if True the writer is woken up immediately (the call still
+            doesn't wait for the line to be written)
+        """
+        timestamp = time.time()
+        dropped = self._allow(tag) if self.rate_limits or self.default_rate_limit is not None else 0
+        if dropped < 0:
+            return
+        logtag = "" if tag == None else "[ " + tag.ljust(self.just if just is None else just) + " ]"
+        message = sep.join(map(str, args))
+        if dropped:
+            message += f"{sep}({dropped} lines dropped)"
+        self._queue.append((timestamp, time_format, sep + logtag + (sep + message if message else "") + end, file))
+        if flush or len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    __call__ = log
+
+    # WRITING ######################################################
+
+    def _prefix(self, timestamp:float, time_format:str) -> str:
+        millisecond = int(timestamp * 1000)
+        cached = self._prefixes.get(time_format)
+        if cached is not None and cached[2] == millisecond:
+            return cached[3]
+        second = millisecond // 1000
+        if cached is not None and cached[0] == second:
+            formatted = cached[1]
+        else:
+            # %f is filled for each millisecond, the rest once per second
+            date = datetime.datetime.fromtimestamp(second)
+            formatted = [date.strftime(part) for part in time_format.split("%f")]
+        prefix = "[ " + f"{millisecond % 1000:03d}000".join(formatted) + " ]"
+        self._prefixes[time_format] = (second, formatted, millisecond, prefix)
+        return prefix
+
+    def _drain(self) -> None:
+        queue = self._queue
+        default_file = self.file
+        default_format = self.time_format
+        batches = {}
+        self._draining = True
+        while queue:
+            timestamp, time_format, line, file = queue.popleft()
+            if file is None:
+                file = default_file if default_file is not None else sys.stdout
+            batch = batches.get(id(file))
+            if batch is None:
+                batch = batches[id(file)] = (file, [])
+            batch[1].append(self._prefix(timestamp, default_format if time_format is None else time_format) + line)
+        for file, lines in batches.values():
+            try:
+                file.write("".join(lines))
+                file.flush()
+            except (OSError, ValueError):
+                # closed or broken file, there is nobody to report this to
+                pass
+        self._draining = False
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+
+    def flush(self, timeout:float=None) -> None:
+        """
+        Waits until the lines logged so far are written
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (self._queue or self._draining) and self._thread.is_alive():
+            self._wake.set()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.001)
+
+    def close(self) -> None:
+        """
+        Writes the queued lines and stops the writer thread (called at exit)
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_default_logger = None
+
+
+def get_default_logger() -> BufferedLogger:
+    """
+    Returns the logger shared by `logged_print`, created at the first call
+    """
+    global _default_logger
+    if _default_logger is None:
+        _default_logger = BufferedLogger()
+    return _default_logger
+
+
+def logged_print(*args, tag:str=None, just:int=8, time_format:str="%Y-%m-%d %H:%M:%S.%f", **kwargs):
+    """
+    Print with logging information in the format:
+    `[ timestamp ] [ tag ] message`
+
+    Drop-in replacement of `useful_functions.logged_print` that writes in
+    background with the default `BufferedLogger`
+
+    Parameters
+    ----------
+    tag : str or None
+        the tag to be used in `[ tag ]` if present
+    just : int
+        min size of tag field, adds padding if `len(tag) < just`
+    time_format : str
+        format to be used in the timestamp field
+        follows the format of `datetime.strftime`
+
+    Notes
+    -----
+    same parameters as `print`
+    """
+    get_default_logger().log(*args, tag=tag, just=just, time_format=time_format, **kwargs)
@@ -0,0 +1,190 @@
+"""
+Lazy chunking of iterables, buffers and arrays.
+
+Chunks (or overlapping windows) are produced on demand without ever
+materializing the whole input and without modifying it: buffers
+(bytes, bytearray, memoryview, mmap...) are split in zero-copy
+memoryview slices and NumPy arrays in views along the first axis,
+while any other iterable or generator is consumed lazily in lists.
+Only a padded last chunk is a copy.
+
+`parallel_map_chunks` applies a function to each chunk using a thread or
+process pool, keeping a bounded number of chunks in flight so that
+inputs of any size can be streamed with constant memory.
+"""
+
+import collections
+import itertools
+import sys
+
+
+def _pad_view(view, size:int, fill):
+    """
+    Returns a padded copy of the last (partial) chunk of a sliceable input
+    """
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(view, np.ndarray):
+        padded = np.full((size,) + view.shape[1:], 0 if fill is None else fill, dtype=view.dtype)
+        padded[:len(view)] = view
+        return padded
+    if view.format not in ("B", "b", "c"):
+        raise ValueError("padding is supported only for byte buffers and NumPy arrays")
+    return memoryview(view.tobytes() + bytes([0 if fill is None else fill]) * (size - len(view)))
+
+
+def _sliced_chunks(view, size:int, step:int, padding:bool, fill):
+    length = len(view)
+    start = 0
+    while start < length:
+        end = start + size
+        if end <= length:
+            yield view[start:end]
+        elif padding:
+            yield _pad_view(view[start:length], size, fill)
+        else:
+            yield view[start:length]
+        if end >= length:
+            break
+        start += step
+
+
+def _iterable_chunks(iterable, size:int, step:int, padding:bool, fill):
+    iterator = iter(iterable)
+    window = list(itertools.islice(iterator, size))
+    while window:
+        full = len(window) == size
+        if full:
+            yield window
+        else:
+            yield window + [fill] * (size - len(window)) if padding else window
+            break
+        if step >= size:
+            # skips the elements between two non overlapping windows
+            collections.deque(itertools.islice(iterator, step - size), maxlen=0)
+            window = list(itertools.islice(iterator, size))
+        else:
+            new = list(itertools.islice(iterator, step))
+            if not new:
+                break
+            window = window[step:] + new
+
+
+def chunks(data, size:int, step:int=None, padding:bool=False, fill=None):
+    """
+    Lazily splits data in chunks of given size, optionally overlapping
+
+    Parameters
+    ----------
+    data : iterable, buffer_like or numpy.ndarray
+        the data to be split. NumPy arrays are split along the first axis
+        in views, objects exposing the buffer interface in memoryview
+        slices, any other iterable (even infinite generators) in lists
+    size : int
+        number of elements of each chunk
+    step : int or None
+        distance between the start of two consecutive chunks. If None it
+        is equal to `size` (contiguous chunks), if smaller the chunks
+        overlap (sliding windows), if bigger some elements are skipped
+    padding : bool
+        if True the last chunk is padded with `fill` up to `size` elements
+        (this is the only chunk that is copied), else it may be shorter
+    fill : object
+        value used for padding. None means 0 for arrays and buffers
+
+    Yields
+    ------
+    list, memoryview or numpy.ndarray
+        the chunks of data, in order
+
+    Notes
+    -----
+    The input is never modified and only the part currently needed is
+    read from iterables. Zero-copy chunks keep a reference to the input
+    buffer, so a bytearray cannot be resized while they are alive
+    """
+    if size < 1:
+        raise ValueError("size must be a positive integer")
+    step = size if step is None else step
+    if step < 1:
+        raise ValueError("step must be a positive integer")
+
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(data, np.ndarray):
+        return _sliced_chunks(data, size, step, padding, fill)
+    if not isinstance(data, str):
+        try:
+            view = memoryview(data)
+        except TypeError:
+            pass
+        else:
+            return _sliced_chunks(view, size, step, padding, fill)
+    return _iterable_chunks(data, size, step, padding, fill)
+
+
+def parallel_map_chunks(function, data, size:int, step:int=None, padding:bool=False, fill=None,
+                        executor="thread", max_workers:int=None, max_in_flight:int=None):
+    """
+    Lazily applies a function to each chunk of data using a pool of workers
+
+    Parameters
+    ----------
+    function : callable
+        function called with each chunk as the only argument. With a
+        process pool it must be picklable (eg. defined at module level)
+    data : iterable, buffer_like or numpy.ndarray
+        the data to be split, see `chunks`
+    size, step, padding, fill :
+        how to split the data, see `chunks`
+    executor : str or concurrent.futures.Executor
+        'thread' or 'process' to create a new pool (shut down at the end),
+        or an existing executor to be used (left running)
+    max_workers : int or None
+        number of workers of the created pool, None for the default
+    max_in_flight : int or None
+        max number of chunks submitted but not yet returned, which bounds
+        the memory used. None means twice the number of workers
+
+    Yields
+    ------
+    object
+        the result of `function` for each chunk, in the same order of the
+        chunks
+
+    Notes
+    -----
+    With a process pool each chunk is pickled (memoryview chunks are
+    converted to bytes first), so zero-copy chunks are copied anyway
+    """
+    import concurrent.futures
+    import os
+
+    own_executor = isinstance(executor, str)
+    if own_executor:
+        if executor == "thread":
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        elif executor == "process":
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+        else:
+            raise ValueError("executor must be 'thread', 'process' or an Executor instance")
+    to_bytes = isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+
+    if max_in_flight is None:
+        max_in_flight = 2 * (max_workers or getattr(executor, "_max_workers", None) or os.cpu_count() or 1)
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be a positive integer")
+
+    pending = collections.deque()
+    try:
+        for chunk in chunks(data, size, step, padding, fill):
+            if to_bytes and isinstance(chunk, memoryview):
+                chunk = chunk.tobytes()
+            pending.append(executor.submit(function, chunk))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
@@ -0,0 +1,228 @@
+"""
+Vectorized color utilities working on NumPy arrays of colors.
+
+These are the array-in/array-out counterparts of the color functions of
+`useful_functions` (`hsv_color`, `color_generator`, `brighten_color`,
+`darken_color` and `random_color`): each call converts or adjusts N
+colors at once, so per-detection or per-frame colors cost a single NumPy
+call instead of N Python ones. Colors are (N, 3) uint8 arrays, in RGB
+order unless `bgr` is True (for OpenCV).
+
+`palette` returns a cached (N, 3) table of well distinguishable colors
+and `Palette` maps labels (class names, track ids...) to its entries with
+a deterministic hash and O(1) lookups.
+"""
+
+import functools
+import zlib
+
+import numpy as np
+
+
+def hsv_colors(hue, sat=1.0, value=1.0, bgr:bool=False) -> np.ndarray:
+    """
+    Converts HSV colors to RGB (or BGR), vectorized version of `hsv_color`
+
+    Parameters
+    ----------
+    hue : float or array_like
+        hue in degrees, any value (taken modulo 360)
+    sat : float or array_like
+        saturation in range 0-1, broadcast against hue
+    value : float or array_like
+        value in range 0-1, broadcast against hue
+    bgr : bool
+        if True the channels are returned in BGR order
+
+    Returns
+    -------
+    numpy.ndarray
+        uint8 array with the broadcast shape of the inputs plus a last
+        axis of 3 channels
+    """
+    hue, sat, value = np.broadcast_arrays(np.asarray(hue, dtype=np.float64), np.asarray(sat, dtype=np.float64),
+                                          np.asarray(value, dtype=np.float64))
+    # same operations of colorsys, for identical rounding
+    h6 = (hue % 360) / 360 * 6.0
+    sector = h6.astype(np.intp)
+    f = h6 - sector
+    sector %= 6
+    p = value * (1 - sat)
+    q = value * (1 - sat * f)
+    t = value * (1 - sat * (1 - f))
+    rgb = np.empty(hue.shape + (3,), dtype=np.float64)
+    rgb[..., 0] = np.choose(sector, (value, q, p, p, t, value))
+    rgb[..., 1] = np.choose(sector, (t, value, value, q, p, p))
+    rgb[..., 2] = np.choose(sector, (p, p, t, value, value, q))
+    rgb *= 255
+    colors = rgb.astype(np.uint8)
+    return colors[..., ::-1] if bgr else colors
+
+
+def hue_sequence(initial:float, step:float, n:int, bgr:bool=False) -> np.ndarray:
+    """
+    Returns the first n colors of `color_generator(initial, step)` as a
+    (n, 3) uint8 array
+    """
+    return hsv_colors(initial + step * np.arange(n), 1.0, 1.0, bgr)
+
+
+def _scale_colors(colors, factor) -> np.ndarray:
+    colors = np.asarray(colors)
+    factor = np.asarray(factor, dtype=np.float64)
+    if factor.ndim:
+        # one factor per color
+        factor = factor[..., np.newaxis]
+    scaled = np.clip(colors * factor, 0, 255)
+    if np.issubdtype(colors.dtype, np.integer):
+        return scaled.astype(colors.dtype)
+    return scaled
+
+
+def brighten_colors(colors, percentage) -> np.ndarray:
+    """
+    Brightens N colors by the given percentage(s), vectorized version of
+    `brighten_color`
+
+    Parameters
+    ----------
+    colors : array_like
+        (..., 3) array of colors in range 0-255
+    percentage : float or array_like
+        percentage to be added, a single value or one per color
+
+    Returns
+    -------
+    numpy.ndarray
+        the brightened colors, clipped to 0-255, with the same dtype of
+        integer inputs (truncated) else float
+    """
+    return _scale_colors(colors, 1 + np.asarray(percentage, dtype=np.float64) * 0.01)
+
+
+def darken_colors(colors, percentage) -> np.ndarray:
+    """
+    Darkens N colors by the given percentage(s), vectorized version of
+    `darken_color` (see `brighten_colors`)
+    """
+    return _scale_colors(colors, 1 - np.asarray(percentage, dtype=np.float64) * 0.01)
+
+
+def label_hash(label) -> int:
+    """
+    Deterministic non-negative hash of a label, unlike `hash` it does not
+    change between runs for strings and bytes
+    """
+    if isinstance(label, (int, np.integer)):
+        return abs(int(label))
+    if isinstance(label, str):
+        label = label.encode("utf-8")
+    if not isinstance(label, (bytes, bytearray, memoryview)):
+        label = repr(label).encode("utf-8")
+    return zlib.crc32(label)
+
+
+def random_colors(labels=None, n:int=None, bgr:bool=True) -> np.ndarray:
+    """
+    Random 3-channel colors, vectorized version of `random_color`
+
+    Parameters
+    ----------
+    labels : iterable, numpy.ndarray or None
+        if given, each label gets a deterministic color, always the same
+        for that label (integer arrays are hashed without Python loops)
+    n : int or None
+        number of random colors when labels is None
+    bgr : bool
+        channels order, BGR by default like `random_color`
+
+    Returns
+    -------
+    numpy.ndarray
+        (N, 3) uint8 array of colors
+    """
+    if labels is None:
+        if n is None:
+            raise ValueError("either labels or n must be given")
+        seeds = np.random.randint(0, 10**9, size=n, dtype=np.int64)
+    elif isinstance(labels, np.ndarray) and np.issubdtype(labels.dtype, np.integer):
+        seeds = np.abs(labels.astype(np.int64)).ravel()
+    else:
+        seeds = np.fromiter((label_hash(label) for label in labels), dtype=np.int64)
+    digits = seeds[:, np.newaxis] // np.array([1, 1000, 1000000], dtype=np.int64) % 1000
+    colors = (256 * digits // 1000).astype(np.uint8)
+    return colors[:, ::-1] if bgr else colors
+
+
+@functools.lru_cache(maxsize=32)
+def palette(n:int, sat:float=1.0, value:float=1.0, bgr:bool=False) -> np.ndarray:
+    """
+    Returns a table of n colors that are as distinct as possible
+
+    Hues are spaced by the golden angle, so each color is far from all the
+    previous ones whatever n is (the first colors of any palette are the
+    same). After every full turn of hue saturation and value alternate
+    between full and reduced, to keep big palettes distinguishable
+
+    Returns
+    -------
+    numpy.ndarray
+        read-only (n, 3) uint8 array, cached for each set of arguments
+    """
+    index = np.arange(n)
+    hue = (index * 137.50776405) % 360
+    turn = (index * 137.50776405) // 360 % 3
+    sats = np.where(turn == 1, sat * 0.55, sat)
+    values = np.where(turn == 2, value * 0.65, value)
+    colors = hsv_colors(hue, sats, values, bgr)
+    colors.flags.writeable = False
+    return colors
+
+
+class Palette:
+    """
+    Maps labels to the colors of a cached `palette` with O(1) lookups
+
+    Examples
+    --------
+    >>> colors = Palette(20, bgr=True)
+    >>> cv2.rectangle(img, p0, p1, colors.color("person"), 2)
+    """
+
+    def __init__(self, n:int=64, sat:float=1.0, value:float=1.0, bgr:bool=False):
+        self.table = palette(n, sat, value, bgr)
+        self._tuples = [tuple(int(c) for c in color) for color in self.table]
+        self._indices = {}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def index(self, label) -> int:
+        """
+        Palette index of a label (deterministic, cached after the first call)
+        """
+        try:
+            return self._indices[label]
+        except KeyError:
+            index = self._indices[label] = label_hash(label) % len(self.table)
+            return index
+        except TypeError:
+            # unhashable label
+            return label_hash(label) % len(self.table)
+
+    def color(self, label) -> tuple:
+        """
+        Color of a label as a tuple of ints, ready for OpenCV drawing functions
+        """
+        return self._tuples[self.index(label)]
+
+    def colors(self, labels) -> np.ndarray:
+        """
+        Colors of many labels as a (N, 3) uint8 array, integer arrays are
+        mapped without Python loops
+        """
+        if isinstance(labels, np.ndarray) and np.issubdtype(labels.dtype, np.integer):
+            indices = np.abs(labels.astype(np.int64)) % len(self.table)
+        else:
+            indices = np.fromiter((self.index(label) for label in labels), dtype=np.intp)
+        return self.table[indices]
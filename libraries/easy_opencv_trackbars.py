@@ -1,6 +1,27 @@
-import cv2
-import numpy as np
 import dataclasses
+import importlib
+
+
+class _LazyModule:
+    """
+    Placeholder of a module that is imported on first attribute access, then
+    replaced in the globals of this module by the real one
+    """
+
+    def __init__(self, name:str, variable:str):
+        self._name = name
+        self._variable = variable
+
+    def __getattr__(self, attribute:str):
+        module = importlib.import_module(self._name)
+        globals()[self._variable] = module
+        return getattr(module, attribute)
+
+
+# OpenCV and NumPy are imported when the first window is created
+cv2 = _LazyModule("cv2", "cv2")
+np = _LazyModule("numpy", "np")
+
 
 class EZTrackbars:
 
@@ -1,94 +1,752 @@
-import numpy as np
-import cv2
+from __future__ import annotations
 
+import collections
+import functools
+import importlib
+import math
 
-def heatmap(img:np.ndarray, cmap:int=None, min_value:float=None, max_value:float=None) -> np.ndarray:
-    if len(img.shape) > 2 or img.shape[3] != 1:
-        raise ValueError("only 2 dimensional arrays are supported as input")
 
-    min_val = np.min(img) if min_value is None else min_value
-    max_val = np.max(img) if max_value is None else max_value
+class _LazyModule:
+    """
+    Placeholder of a module that is imported on first attribute access, then
+    replaced in the globals of this module by the real one
+    """
 
-    if min_value is not None or max_value is not None:
-        img = np.clip(img, min_val, max_val)
+    def __init__(self, name:str, variable:str):
+        self._name = name
+        self._variable = variable
 
-    img = (255 * (img - min_val) / (max_val - min_val)).astype(np.uint8)
-    
-    if cmap is None:
+    def __getattr__(self, attribute:str):
+        module = importlib.import_module(self._name)
+        globals()[self._variable] = module
+        return getattr(module, attribute)
+
+
+# modules imported on first use, annotations are not evaluated
+np = _LazyModule("numpy", "np")
+cv2 = _LazyModule("cv2", "cv2")
+textwrap = _LazyModule("textwrap", "textwrap")
+
+
+_colormap_luts = {}
+
+
+def colormap_lut(cmap) -> np.ndarray:
+    """
+    Returns the (256, 1, 3) uint8 BGR table of an OpenCV colormap (eg.
+    cv2.COLORMAP_JET), computed once and cached (read-only). A custom table
+    of 256 colors is returned in the same shape
+    """
+    if not isinstance(cmap, int):
+        return np.ascontiguousarray(cmap, dtype=np.uint8).reshape(256, 1, 3)
+    lut = _colormap_luts.get(cmap)
+    if lut is None:
+        lut = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cmap).reshape(256, 1, 3)
+        lut.flags.writeable = False
+        _colormap_luts[cmap] = lut
+    return lut
+
+
+class Heatmapper:
+    """
+    Converts single-channel images (depth, thermal...) into heatmaps, frame
+    after frame, reusing buffers and lookup tables
+
+    Notes
+    -----
+    Values are mapped to 0-255 as `255 * (img - min) / (max - min)` (clipped)
+    like `heatmap`, then colored with the cached table of the colormap
+    (see `colormap_lut`).
+    The range can be fixed or follow the frames:
+    'frame' uses min and max of each frame, 'running' the min and max of all
+    the frames seen so far and 'ema' an exponential moving average of the
+    min and max of each frame (smooth and adapting to changes).
+    Integer images up to 16 bits are normalized with a table lookup per
+    pixel (the table is rebuilt only when the range changes), other images
+    with in-place float operations on buffers allocated once
+    """
+
+    def __init__(self, cmap:int=None, min_value:float=None, max_value:float=None, normalization:str="frame",
+                 alpha:float=0.1):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        cmap : int, array_like or None
+            OpenCV colormap (eg. cv2.COLORMAP_JET) or table of 256 BGR
+            colors, None for grayscale output
+        min_value, max_value : float or None
+            fixed limits of the range, None to follow the frames
+        normalization : str
+            how the limits that are not fixed follow the frames, 'frame',
+            'running' or 'ema'
+        alpha : float
+            weight of the new frame in 'ema' normalization (0-1)
+        """
+        if normalization not in ("frame", "running", "ema"):
+            raise ValueError("normalization must be 'frame', 'running' or 'ema'")
+        self.cmap = cmap
+        self._colors = None if cmap is None else colormap_lut(cmap)
+        self.fixed_min = min_value
+        self.fixed_max = max_value
+        self.normalization = normalization
+        self.alpha = alpha
+        self._lut = None
+        self._lut_key = None
+        self._buffer = None
+        self._indices = None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forgets the range of the frames seen so far
+        """
+        self.min_value = self.fixed_min
+        self.max_value = self.fixed_max
+
+    def _follow(self, current:float, value:float, running) -> float:
+        # new value of a limit that is not fixed, running is min or max
+        if self.normalization == "frame" or current is None:
+            return value
+        if self.normalization == "running":
+            return running(current, value)
+        return current + self.alpha * (value - current)
+
+    def _update_range(self, frame_min:float, frame_max:float) -> tuple:
+        # the limit of the frame is None when the limit is fixed
+        self.min_value = self.fixed_min if self.fixed_min is not None else self._follow(self.min_value, frame_min, min)
+        self.max_value = self.fixed_max if self.fixed_max is not None else self._follow(self.max_value, frame_max, max)
+        return self.min_value, self.max_value
+
+    def _integer_lut(self, dtype:np.dtype, low:float, high:float) -> np.ndarray:
+        key = (dtype, low, high)
+        if key != self._lut_key:
+            # position i holds the value i as dtype (signed values wrap like negative indices)
+            values = np.arange(1 << (8 * dtype.itemsize)).astype(dtype).astype(np.float64)
+            self._lut = self._scale(values, low, high, values).astype(np.uint8)
+            self._lut_key = key
+        return self._lut
+
+    @staticmethod
+    def _scale(img:np.ndarray, low:float, high:float, out:np.ndarray) -> np.ndarray:
+        np.clip(img, low, high, out=out)
+        np.subtract(out, low, out=out)
+        np.multiply(out, 255, out=out)
+        if high > low:
+            np.divide(out, high - low, out=out)
+        return out
+
+    def _output(self, shape:tuple, out:np.ndarray) -> np.ndarray:
+        shape = shape if self.cmap is None else shape + (3,)
+        if out is None:
+            return np.empty(shape, dtype=np.uint8)
+        if out.shape != shape or out.dtype != np.uint8:
+            raise ValueError(f"out must be an uint8 array of shape {shape}")
+        return out
+
+    def _map(self, img:np.ndarray, low:float, high:float, out:np.ndarray) -> np.ndarray:
+        if self._colors is None:
+            indices = out
+        else:
+            if self._indices is None or self._indices.shape != img.shape:
+                self._indices = np.empty(img.shape, dtype=np.uint8)
+            indices = self._indices
+        if img.dtype.kind in "ui" and img.dtype.itemsize <= 2:
+            np.take(self._integer_lut(img.dtype, low, high), img, out=indices)
+        else:
+            dtype = img.dtype if img.dtype.kind == "f" else np.float64
+            if self._buffer is None or self._buffer.shape != img.shape or self._buffer.dtype != dtype:
+                self._buffer = np.empty(img.shape, dtype=dtype)
+            np.copyto(indices, self._scale(img, low, high, self._buffer), casting="unsafe")
+        if self._colors is None:
+            return out
+        if indices.ndim == 2:
+            return cv2.applyColorMap(indices, self._colors, dst=out)
+        for frame_indices, frame_out in zip(indices, out):
+            cv2.applyColorMap(frame_indices, self._colors, dst=frame_out)
+        return out
+
+    @staticmethod
+    def _check(img:np.ndarray, batch:bool) -> np.ndarray:
+        ndim = 3 if batch else 2
+        if img.ndim == ndim + 1 and img.shape[-1] == 1:
+            img = img[..., 0]
+        if img.ndim != ndim:
+            raise ValueError(f"only {ndim} dimensional arrays (or with a last axis of size 1) are supported as input")
         return img
-    return cv2.applyColorMap(img, cmap)
+
+    def __call__(self, img:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        """
+        Converts a frame into a heatmap
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            (H, W) or (H, W, 1) single-channel image
+        out : numpy.ndarray or None
+            uint8 array where to write the result, (H, W, 3) with a
+            colormap else (H, W)
+
+        Returns
+        -------
+        numpy.ndarray
+            the heatmap (out if given)
+        """
+        img = self._check(img, batch=False)
+        low = high = None
+        if self.fixed_min is None:
+            low = img.min()
+        if self.fixed_max is None:
+            high = img.max()
+        low, high = self._update_range(low, high)
+        return self._map(img, low, high, self._output(img.shape, out))
+
+    def apply_batch(self, stack:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+        """
+        Converts a stack of frames into heatmaps, updating the range frame by
+        frame as if they were given one at a time
+
+        Parameters
+        ----------
+        stack : numpy.ndarray
+            (N, H, W) or (N, H, W, 1) single-channel images
+        out : numpy.ndarray or None
+            uint8 array where to write the results, (N, H, W, 3) with a
+            colormap else (N, H, W)
+        """
+        stack = self._check(stack, batch=True)
+        out = self._output(stack.shape, out)
+        if len(stack) == 0:
+            return out
+        # the limits of all the frames at once, then only scalars per frame
+        mins = stack.min(axis=(1, 2)) if self.fixed_min is None else [None] * len(stack)
+        maxs = stack.max(axis=(1, 2)) if self.fixed_max is None else [None] * len(stack)
+        ranges = [self._update_range(low, high) for low, high in zip(mins, maxs)]
+        if stack.dtype.kind == "f" and all(r == ranges[0] for r in ranges):
+            # same range for all the frames (eg. fixed), mapped in one go
+            return self._map(stack, *ranges[0], out)
+        for frame, (low, high), frame_out in zip(stack, ranges, out):
+            self._map(frame, low, high, frame_out)
+        return out
 
 
-def put_wrapped_text(img:np.ndarray, text:str, width:int, gap:int, org:tuple, 
-                     font:int, scale:float, color:tuple, thickness:int=1, **kwargs) -> None:
-    # IMPORTS ########
-    import textwrap
-    ##################
+def heatmap(img:np.ndarray, cmap:int=None, min_value:float=None, max_value:float=None) -> np.ndarray:
+    """
+    Converts a single-channel image into a heatmap (see `Heatmapper` to
+    convert many frames reusing buffers and normalization)
+    """
+    return Heatmapper(cmap, min_value, max_value)(img)
+
+
+@functools.lru_cache(maxsize=1024)
+def _wrapped_text_layout(text:str, width:int, font:int, scale:float, thickness:int) -> tuple:
+    """
+    Height of the text and its lines wrapped by put_wrapped_text
+    """
     textsize = cv2.getTextSize(text, font, scale, thickness)[0]
-    gap = textsize[1] + gap
     char_size = textsize[0]/len(text)
     wrap_size = int(width / char_size)
     if wrap_size == 0:
+        return textsize[1], ()
+    return textsize[1], tuple(textwrap.wrap(text, width=wrap_size))
+
+
+def put_wrapped_text(img:np.ndarray, text:str, width:int, gap:int, org:tuple, 
+                     font:int, scale:float, color:tuple, thickness:int=1, **kwargs) -> None:
+    """
+    Draws a text wrapped to fit in width (estimated from the average width
+    of its characters), the layout is cached. See `TextRenderer` to redraw
+    the same texts many times
+    """
+    if not text:
         return
-    wrapped_text = textwrap.wrap(text, width=wrap_size)
+    text_height, wrapped_text = _wrapped_text_layout(text, width, font, scale, thickness)
+    gap = text_height + gap
     for i, line in enumerate(wrapped_text):
         x = org[0]
         y = int(org[1] + i * gap)
         cv2.putText(img, line, (x, y), font, scale, color, thickness, **kwargs)
 
 
+class TextRenderer:
+    """
+    Draws texts (wrapped to a width) that are redrawn many times, like
+    captions of a video overlay
+
+    Notes
+    -----
+    Two bounded LRU caches are kept: the layout of each (text, width)
+    (lines wrapped on their measured width, size of the block) and the
+    sprite of each (text, width, color), rasterized once with its
+    antialiased alpha mask. Drawing a cached text is a single fixed-point
+    blit of the sprite (see `composite`) instead of cv2.getTextSize and
+    cv2.putText for each line. Font, scale and thickness are fixed for the
+    renderer, use one renderer per style
+    """
+
+    def __init__(self, font:int=None, scale:float=1.0, thickness:int=1, gap:int=5, line_type:int=None,
+                 max_layouts:int=1024, max_sprites:int=256):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        font : int or None
+            OpenCV font, None for cv2.FONT_HERSHEY_SIMPLEX
+        scale : float
+            font scale
+        thickness : int
+            thickness of the strokes
+        gap : int
+            pixels between the lines
+        line_type : int or None
+            OpenCV line type, None for cv2.LINE_AA
+        max_layouts : int
+            max number of layouts cached, the least recently used are
+            discarded
+        max_sprites : int
+            max number of sprites cached, the least recently used are
+            discarded
+        """
+        self.font = cv2.FONT_HERSHEY_SIMPLEX if font is None else font
+        self.scale = scale
+        self.thickness = thickness
+        self.gap = gap
+        self.line_type = cv2.LINE_AA if line_type is None else line_type
+        self.max_layouts = max_layouts
+        self.max_sprites = max_sprites
+        # margin around the text for the antialiasing and the thickness
+        self.padding = thickness + 1
+        self._layouts = collections.OrderedDict()
+        self._sprites = collections.OrderedDict()
+
+    @staticmethod
+    def _cached(cache:collections.OrderedDict, max_size:int, key:tuple, factory):
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = factory()
+            if len(cache) > max_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return value
+
+    def _text_width(self, text:str) -> int:
+        return cv2.getTextSize(text, self.font, self.scale, self.thickness)[0][0]
+
+    def _layout(self, text:str, width:int) -> tuple:
+        lines = []
+        for paragraph in text.split("\n"):
+            line = None
+            for word in paragraph.split():
+                candidate = word if line is None else line + " " + word
+                if line is None or width is None or self._text_width(candidate) <= width:
+                    line = candidate
+                else:
+                    lines.append(line)
+                    line = word
+            lines.append("" if line is None else line)
+        (_, ascent), descent = cv2.getTextSize("Ay", self.font, self.scale, self.thickness)
+        block_width = max(self._text_width(line) for line in lines)
+        step = ascent + self.gap
+        block_height = ascent + step * (len(lines) - 1) + descent
+        return tuple(lines), (block_width, block_height), ascent, step
+
+    def layout(self, text:str, width:int=None) -> tuple:
+        """
+        Returns the layout of a text wrapped to width pixels (None to break
+        only on new lines), computed once: (lines, (width, height) of the
+        block, ascent of the first line, distance between the baselines)
+        """
+        return self._cached(self._layouts, self.max_layouts, (text, width), lambda: self._layout(text, width))
+
+    def _rasterize(self, text:str, width:int, color:tuple) -> Sprite:
+        lines, (block_width, block_height), ascent, step = self.layout(text, width)
+        mask = np.zeros((block_height + 2 * self.padding, block_width + 2 * self.padding), dtype=np.uint8)
+        for i, line in enumerate(lines):
+            cv2.putText(mask, line, (self.padding, self.padding + ascent + i * step), self.font, self.scale, 255,
+                        self.thickness, self.line_type)
+        color = tuple(color)
+        # single value colors are for single-channel images
+        image = np.empty(mask.shape + ((len(color),) if len(color) > 1 else ()), dtype=np.uint8)
+        image[:] = color
+        return Sprite(image, mask)
+
+    def sprite(self, text:str, width:int=None, color:tuple=(255, 255, 255)) -> Sprite:
+        """
+        Returns the sprite of a text wrapped to width pixels with given
+        color, rasterized once. Its top-left corner goes at (x - padding,
+        y - ascent - padding) to draw the text at org (x, y)
+        """
+        color = tuple(color) if isinstance(color, (tuple, list)) else (color,)
+        return self._cached(self._sprites, self.max_sprites, (text, width, color),
+                            lambda: self._rasterize(text, width, color))
+
+    def draw(self, img:np.ndarray, text:str, org:tuple, color:tuple=(255, 255, 255), width:int=None) -> None:
+        """
+        Draws a text on a uint8 image with the bottom-left corner of the
+        first line at org (like cv2.putText), wrapped to width pixels (None
+        to break only on new lines)
+        """
+        sprite = self.sprite(text, width, color)
+        ascent = self.layout(text, width)[2]
+        composite(img, ((sprite, org[0] - self.padding, org[1] - ascent - self.padding),))
+
+    def clear_cache(self) -> None:
+        """
+        Forgets the layouts and the sprites
+        """
+        self._layouts.clear()
+        self._sprites.clear()
+
+
+def _overlay_region(shape:tuple, overlay_shape:tuple, x:int, y:int) -> tuple:
+    """
+    Slices of the image and of the overlay placed at (x, y) that overlap,
+    None if the overlay is completely outside the image
+    """
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(shape[1], x + overlay_shape[1]), min(shape[0], y + overlay_shape[0])
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return (slice(y1, y2), slice(x1, x2)), (slice(y1 - y, y2 - y), slice(x1 - x, x2 - x))
+
+
+def _alpha_256(alpha:np.ndarray, shape:tuple, max_value:int=1) -> np.ndarray:
+    """
+    Converts an alpha mask (float 0-1 or integer 0-max_value) into contiguous
+    uint16 weights in range 0-256 with the given shape (one per channel,
+    broadcast operands are much slower in the blend)
+    """
+    if alpha.dtype.kind in "ui":
+        alpha = np.clip(alpha, 0, max_value).astype(np.uint16)
+        alpha = (alpha * 256 + max_value // 2) // max_value
+    else:
+        alpha = np.rint(np.clip(alpha, 0, 1) * 256).astype(np.uint16)
+    if len(shape) == 3 and alpha.ndim == 2:
+        alpha = alpha[..., np.newaxis]
+    return np.ascontiguousarray(np.broadcast_to(alpha, shape))
+
+
+def _blend_fixed_point(crop:np.ndarray, premultiplied:np.ndarray, inverse:np.ndarray, scratch:np.ndarray) -> None:
+    # crop = (overlay * alpha + crop * (256 - alpha) + 128) >> 8, everything fits in uint16
+    np.multiply(crop, inverse, out=scratch)
+    scratch += premultiplied
+    np.right_shift(scratch, 8, out=crop, casting="unsafe")
+
+
 def overlay_image_alpha(img, img_overlay, x, y, alpha_mask=None):
     """Overlay `img_overlay` onto `img` at (x, y) and blend using optional `alpha_mask`.
 
-    `alpha_mask` must have same HxW as `img_overlay` and values in range [0, 1].
+    `alpha_mask` must have same HxW as `img_overlay` and values in range [0, 1],
+    integer masks included (a uint8 mask of 0 and 1 pastes the overlay, see
+    `Sprite` for uint8 masks in range 0-255). uint8 images are blended in 8-bit fixed-point (within 1 of the exact
+    float blend), see `Sprite` and `composite` to draw many overlays
     """
+    region = _overlay_region(img.shape, img_overlay.shape, x, y)
+    if region is None:
+        return
+    img_slices, overlay_slices = region
+    img_crop = img[img_slices]
+    img_overlay_crop = img_overlay[overlay_slices]
+    if alpha_mask is None:
+        img_crop[:] = img_overlay_crop
+        return
+    alpha = alpha_mask[overlay_slices]
 
-    if y < 0 or y + img_overlay.shape[0] > img.shape[0] or x < 0 or x + img_overlay.shape[1] > img.shape[1]:
-        y_origin = 0 if y > 0 else -y
-        y_end = img_overlay.shape[0] if y < 0 else min(img.shape[0] - y, img_overlay.shape[0])
+    if img.dtype == np.uint8 and img_overlay.dtype == np.uint8:
+        alpha = _alpha_256(alpha, img_crop.shape)
+        premultiplied = img_overlay_crop * alpha
+        premultiplied += 128
+        _blend_fixed_point(img_crop, premultiplied, 256 - alpha, np.empty(img_crop.shape, dtype=np.uint16))
+    else:
+        if img_crop.ndim == 3 and alpha.ndim == 2:
+            alpha = alpha[..., np.newaxis]
+        img_crop[:] = alpha * img_overlay_crop + (1.0 - alpha) * img_crop
 
-        x_origin = 0 if x > 0 else -x
-        x_end = img_overlay.shape[1] if x < 0 else min(img.shape[1] - x, img_overlay.shape[1])
 
-        img_overlay_crop = img_overlay[y_origin:y_end, x_origin:x_end]
-        alpha = alpha_mask[y_origin:y_end, x_origin:x_end] if alpha_mask is not None else None
-    else:
-        img_overlay_crop = img_overlay
-        alpha = alpha_mask
+class Sprite:
+    """
+    uint8 image with its alpha precomputed for fixed-point blending, to be
+    drawn many times with `composite`
+    """
 
-    y1 = max(y, 0)
-    y2 = min(img.shape[0], y1 + img_overlay_crop.shape[0])
+    def __init__(self, image:np.ndarray, alpha_mask:np.ndarray=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            uint8 image, BGRA images without alpha_mask use their 4th
+            channel as alpha
+        alpha_mask : numpy.ndarray or None
+            alpha with the same HxW of the image, float in range 0-1 or uint8
+            in range 0-255. None for opaque images
+        """
+        if image.dtype != np.uint8:
+            raise ValueError("only uint8 images are supported")
+        if alpha_mask is None and image.ndim == 3 and image.shape[2] == 4:
+            image, alpha_mask = image[..., :3], image[..., 3]
+        self.image = np.ascontiguousarray(image)
+        self.shape = self.image.shape
+        if alpha_mask is None:
+            self.alpha = None
+            return
+        if alpha_mask.shape[:2] != image.shape[:2]:
+            raise ValueError("alpha_mask must have the same HxW of the image")
+        self._set_alpha(_alpha_256(alpha_mask, self.shape, 255 if alpha_mask.dtype == np.uint8 else 1))
+
+    def _set_alpha(self, alpha:np.ndarray) -> None:
+        self.alpha = alpha
+        self.inverse = 256 - alpha
+        self.premultiplied = self.image * alpha
+        self.premultiplied += 128
+
+    def with_opacity(self, opacity:float) -> "Sprite":
+        """
+        Returns a new sprite with the alpha multiplied by opacity (0-1)
+        """
+        sprite = Sprite(self.image)
+        weight = int(round(min(max(opacity, 0), 1) * 256))
+        alpha = np.full(self.shape, 256, dtype=np.uint16) if self.alpha is None else self.alpha
+        sprite._set_alpha((alpha * weight + 128) >> 8)
+        return sprite
+
+
+def composite(canvas:np.ndarray, placements) -> np.ndarray:
+    """
+    Draws many overlays on a canvas in a single pass, with fixed-point alpha
+    blending
+
+    Parameters
+    ----------
+    canvas : numpy.ndarray
+        uint8 image modified in place
+    placements : iterable
+        tuples (sprite, x, y) or (sprite, x, y, alpha) applied in order,
+        where sprite is a `Sprite` or a uint8 image, (x, y) the position of
+        its top-left corner (can be outside the canvas) and alpha None, an
+        opacity for the whole sprite (0-1) or an alpha mask for an image
+        (as in `Sprite`, a uint8 mask is in range 0-255)
+
+    Returns
+    -------
+    numpy.ndarray
+        the canvas
+
+    Notes
+    -----
+    Precompute the `Sprite` of images drawn many times, otherwise their
+    alpha is converted at each call
+    """
+    if canvas.dtype != np.uint8:
+        raise ValueError("only uint8 canvases are supported")
+    scratch = np.empty(0, dtype=np.uint16)
+    for placement in placements:
+        sprite, x, y = placement[:3]
+        alpha = placement[3] if len(placement) > 3 else None
+        if not isinstance(sprite, Sprite):
+            sprite = Sprite(sprite, alpha if isinstance(alpha, np.ndarray) else None)
+        if alpha is not None and not isinstance(alpha, np.ndarray) and alpha != 1:
+            sprite = sprite.with_opacity(alpha)
+
+        region = _overlay_region(canvas.shape, sprite.shape, x, y)
+        if region is None:
+            continue
+        canvas_slices, sprite_slices = region
+        crop = canvas[canvas_slices]
+        if sprite.alpha is None:
+            crop[:] = sprite.image[sprite_slices]
+            continue
+        if scratch.size < crop.size:
+            scratch = np.empty(crop.size, dtype=np.uint16)
+        _blend_fixed_point(crop, sprite.premultiplied[sprite_slices], sprite.inverse[sprite_slices],
+                           scratch[:crop.size].reshape(crop.shape))
+    return canvas
 
-    x1 = max(x, 0)
-    x2 = min(img.shape[1], x1 + img_overlay_crop.shape[1])
 
-    img_crop = img[y1:y2, x1:x2]
-    img_crop[:] = alpha * img_overlay_crop + (1.0 - alpha) * img_crop if alpha is not None else img_overlay_crop
+@functools.lru_cache(maxsize=1024)
+def _resize_plan(image_rows:int, image_cols:int, cols:int, rows:int) -> tuple:
+    """
+    Ratio of an image resized to fit in (cols, rows) keeping the aspect
+    ratio, its size (w, h) and its offset (row, col) in the letterbox
+    """
+    ratio = min(rows / float(image_rows), cols / float(image_cols))
+    # the size computed by cv2.resize with fx = fy = ratio
+    resized_cols, resized_rows = round(image_cols * ratio), round(image_rows * ratio)
+    return ratio, (resized_cols, resized_rows), ((rows - resized_rows) // 2, (cols - resized_cols) // 2)
 
 
 def image_resize(image, size, letterbox=True, out=None):
     """
-    Letter box (black bars) a color image (think pan & scan movie shown 
+    Letter box (black bars) an image (think pan & scan movie shown 
     on widescreen) if not same aspect ratio as specified size. 
+    The bars of a given out are left untouched. See `Resizer` to resize 
+    many images of the same shape
+    """
+    cols, rows = int(size[0]), int(size[1])
+    ratio, dsize, (row_start, col_start) = _resize_plan(image.shape[0], image.shape[1], cols, rows)
+
+    if not letterbox:
+        return cv2.resize(image, dsize=None, fx=ratio, fy=ratio)
+
+    if out is None:
+        out = np.zeros((rows, cols) + image.shape[2:], dtype=image.dtype)
+    roi = out[row_start:row_start + dsize[1], col_start:col_start + dsize[0]]
+    if out.dtype == image.dtype and out.shape[2:] == image.shape[2:]:
+        if roi.ndim == 3 and roi.shape[2] == 1:
+            # cv2.resize drops the single channel axis
+            roi = roi[..., 0]
+        cv2.resize(image, dsize=None, dst=roi, fx=ratio, fy=ratio)
+    else:
+        # cv2.resize would allocate a new dst instead of writing into roi,
+        # the resized image is cast (and a gray one broadcast) into it
+        resized = cv2.resize(image, dsize=None, fx=ratio, fy=ratio)
+        if resized.ndim < roi.ndim:
+            resized = resized[..., np.newaxis]
+        roi[...] = resized
+    return out
+
+
+class Resizer:
+    """
+    Resizes (and letterboxes) many images, typically frames of the same
+    shape to the same size, without recomputing anything per frame
+
+    Notes
+    -----
+    For each (source shape, dtype, size) the plan (resized size, letterbox
+    ROI, interpolation) is computed once and the output buffer is allocated
+    once, with the bars already filled: each call just runs `cv2.resize`
+    into the ROI of the buffer. The returned image is therefore overwritten
+    by the next call with the same shapes, copy it (or pass out) to keep it.
+    `resize_batch` spreads the images on a thread pool, OpenCV releases the
+    GIL so the resizes run in parallel
     """
-    cols, rows = size
-    image_rows, image_cols = image.shape[:2]
-    row_ratio = rows / float(image_rows)
-    col_ratio = cols / float(image_cols)
-    ratio = min(row_ratio, col_ratio)
-    
-    image_resized = cv2.resize(image, dsize=(None, None), fx=ratio, fy=ratio)
 
-    if letterbox:
-        shape = (int(rows), int(cols), 3)
+    def __init__(self, letterbox:bool=True, interpolation:int=None, background=0, max_workers:int=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        letterbox : bool
+            if True the images are letterboxed in the exact size, otherwise
+            only resized to fit in it keeping the aspect ratio
+        interpolation : int or None
+            OpenCV interpolation flag, None for cv2.INTER_LINEAR like
+            `image_resize` (cv2.INTER_AREA looks better when shrinking
+            but is slower)
+        background : scalar or tuple
+            color of the bars of the letterbox
+        max_workers : int or None
+            number of threads of `resize_batch`, None for the default of
+            concurrent.futures.ThreadPoolExecutor
+        """
+        self.letterbox = letterbox
+        self.interpolation = interpolation
+        self.background = background
+        self.max_workers = max_workers
+        self._plans = {}
+        self._buffers = {}
+        self._executor = None
+
+    def plan(self, shape:tuple, dtype, size:tuple) -> tuple:
+        """
+        Returns the plan (ratio, resized size (w, h), destination ROI as
+        slices, interpolation, output shape) to resize an image of given shape and
+        dtype to size (w, h), computed once
+        """
+        key = (shape, np.dtype(dtype).str, size[0], size[1])
+        plan = self._plans.get(key)
+        if plan is None:
+            cols, rows = int(size[0]), int(size[1])
+            ratio, dsize, (row_start, col_start) = _resize_plan(shape[0], shape[1], cols, rows)
+            interpolation = cv2.INTER_LINEAR if self.interpolation is None else self.interpolation
+            if self.letterbox:
+                roi = (slice(row_start, row_start + dsize[1]), slice(col_start, col_start + dsize[0]))
+                out_shape = (rows, cols) + tuple(shape[2:])
+            else:
+                roi = (slice(None), slice(None))
+                out_shape = (dsize[1], dsize[0]) + tuple(shape[2:])
+            plan = self._plans[key] = (ratio, dsize, roi, interpolation, out_shape)
+        return plan
+
+    def _buffer(self, key:tuple, out_shape:tuple, dtype) -> np.ndarray:
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.empty(out_shape, dtype=dtype)
+            buffer[:] = self.background
+        return buffer
+
+    def _resize(self, image:np.ndarray, size:tuple, out:np.ndarray, index:int) -> np.ndarray:
+        ratio, dsize, roi, interpolation, out_shape = self.plan(image.shape, image.dtype, size)
         if out is None:
-            out = np.zeros(shape, dtype=np.uint8)
-        row_start = int((out.shape[0] - image_resized.shape[0]) / 2)
-        col_start = int((out.shape[1] - image_resized.shape[1]) / 2)
-        out[row_start:row_start + image_resized.shape[0], col_start:col_start + image_resized.shape[1]] = image_resized
+            out = self._buffer((image.shape, image.dtype.str, size[0], size[1], index), out_shape, image.dtype)
+        elif out.shape != out_shape:
+            raise ValueError(f"out must have shape {out_shape}")
+        dst = out[roi]
+        if image.ndim == 3 and image.shape[2] == 1:
+            # cv2.resize drops the single channel axis
+            dst = dst[..., 0]
+        if out.dtype == image.dtype:
+            cv2.resize(image, dsize=None, dst=dst, fx=ratio, fy=ratio, interpolation=interpolation)
+        else:
+            # cv2.resize would allocate a new dst instead of writing into out
+            dst[...] = cv2.resize(image, dsize=None, fx=ratio, fy=ratio, interpolation=interpolation)
         return out
 
-    return image_resized
+    def resize(self, image:np.ndarray, size:tuple, out:np.ndarray=None) -> np.ndarray:
+        """
+        Resizes an image to size (w, h), into out if given (its bars are
+        left untouched) or into the buffer reused by the next call with the
+        same shapes
+        """
+        return self._resize(image, (int(size[0]), int(size[1])), out, 0)
+
+    def resize_batch(self, images:list, size:tuple, out:list=None) -> list:
+        """
+        Resizes a list of images to size (w, h) in parallel on a thread
+        pool, the results are in the same order of the images. out can be a
+        list of outputs (or an array of N outputs), otherwise each position
+        of the batch reuses its own buffers between calls
+        """
+        size = (int(size[0]), int(size[1]))
+        if out is not None and len(out) != len(images):
+            raise ValueError("out must have the same length of images")
+        outs = [None] * len(images) if out is None else out
+        if len(images) < 2:
+            return [self._resize(image, size, o, i) for i, (image, o) in enumerate(zip(images, outs))]
+        if self._executor is None:
+            import concurrent.futures
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+        # the plans are computed here, so the workers only read the caches
+        for image in images:
+            self.plan(image.shape, image.dtype, size)
+        return list(self._executor.map(self._resize, images, [size] * len(images), outs, range(len(images))))
+
+    def clear_cache(self) -> None:
+        """
+        Forgets the plans and the buffers
+        """
+        self._plans.clear()
+        self._buffers.clear()
+
+    def close(self) -> None:
+        """
+        Shuts down the thread pool of `resize_batch`
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 def get_resize_params_keep_aspect_ratio(w:int, h:int, max_size:int=1000) -> tuple[tuple[int, int], float]:
@@ -105,7 +763,8 @@ def get_resize_params_keep_aspect_ratio(w:int, h:int, max_size:int=1000) -> tupl
     return (w, h), scale
 
 
-def image_resize_max_keep_aspect_ratio(image:cv2.Mat, max_size:int=1000, inter:int=cv2.INTER_AREA) -> tuple[cv2.Mat, tuple[int, int], float]:
+def image_resize_max_keep_aspect_ratio(image:cv2.Mat, max_size:int=1000, inter:int=None) -> tuple[cv2.Mat, tuple[int, int], float]:
+    """ inter : OpenCV interpolation flag, None for cv2.INTER_AREA """
     h, w = image.shape[:2]
 
     dim, scale = get_resize_params_keep_aspect_ratio(w, h, max_size)
@@ -113,7 +772,7 @@ def image_resize_max_keep_aspect_ratio(image:cv2.Mat, max_size:int=1000, inter:i
     if scale == 1.0:
         return image.copy(), dim, 1.0
     else:
-        return cv2.resize(image, dim, interpolation=inter), dim, scale
+        return cv2.resize(image, dim, interpolation=cv2.INTER_AREA if inter is None else inter), dim, scale
 
 
 def stack_images(stack:list, shape:tuple=None, background:tuple=(0,0,0)) -> np.ndarray:
@@ -127,11 +786,13 @@ def stack_images(stack:list, shape:tuple=None, background:tuple=(0,0,0)) -> np.n
 
     example:
     grid = stack_images([[img0_r0, img1_r0, img2_r0], [img0_r1, img1_r1, img2_r1], ...], shape=(600, 800), background=(255, 0, 255))
+
+    see Mosaic to stack live feeds redrawing only the images that changed
     """
     if stack[0][0] is None:
         raise ValueError("First element of the grid cannot be None")
 
-    if shape[0] <= 0 or shape[1] <= 0:
+    if shape is not None and (shape[0] <= 0 or shape[1] <= 0):
         raise ValueError("Shape cannot have a 0 or negative element")
     
     rows = len(stack)
@@ -157,6 +818,179 @@ def stack_images(stack:list, shape:tuple=None, background:tuple=(0,0,0)) -> np.n
     return canvas
 
 
+def _best_arrangement(n:int) -> tuple:
+    # same as useful_functions.find_best_arrangement: (short side, long side)
+    long_side = math.isqrt(n - 1) + 1
+    return (n + long_side - 1) // long_side, long_side
+
+
+class Mosaic:
+    """
+    Grid of many images (eg. live camera feeds) kept on a persistent canvas,
+    redrawing only the tiles whose image changed
+
+    Notes
+    -----
+    Like `stack_images` each image is letterboxed in its tile keeping the
+    aspect ratio, but the canvas is allocated once and `render` resizes
+    only the dirty tiles: the ones whose image is a different object from
+    the one of the previous render, or marked with `update` or `invalidate`
+    (needed for buffers modified in place). The dirty tiles are rendered in
+    parallel on a thread pool, OpenCV releases the GIL while resizing
+    """
+
+    def __init__(self, shape:tuple, count:int=None, grid:tuple=None, background:tuple=(0,0,0),
+                 interpolation:int=None, max_workers:int=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        shape : tuple
+            (height, width) of the canvas
+        count : int or None
+            number of images, the grid is the most square one that holds
+            them (more columns than rows for a landscape canvas)
+        grid : tuple or None
+            (rows, columns) of the grid, overrides count
+        background : tuple
+            color of the empty tiles and of the margins
+        interpolation : int or None
+            OpenCV interpolation flag, None for cv2.INTER_LINEAR
+        max_workers : int or None
+            number of threads rendering the tiles, 1 to render them in the
+            calling thread, None for the default of ThreadPoolExecutor
+        """
+        if grid is None:
+            if count is None or count <= 0:
+                raise ValueError("Either a positive count or the grid must be given")
+            grid = _best_arrangement(count)
+            if shape[0] > shape[1]:
+                grid = grid[::-1]
+        rows, columns = grid
+        if rows <= 0 or columns <= 0 or shape[0] // rows <= 0 or shape[1] // columns <= 0:
+            raise ValueError("Shape and grid must give tiles of at least one pixel")
+
+        self.rows = rows
+        self.columns = columns
+        self.tile_shape = (shape[0] // rows, shape[1] // columns)
+        self.background = background
+        self.interpolation = cv2.INTER_LINEAR if interpolation is None else interpolation
+        self.max_workers = max_workers
+        self.canvas = np.empty((shape[0], shape[1], 3), dtype=np.uint8)
+        self.canvas[:] = background
+        self._images = [None] * (rows * columns)
+        # shape of the image drawn in each tile, the bars are redrawn when it changes
+        self._drawn_shapes = [None] * (rows * columns)
+        self._dirty = set()
+        self._executor = None
+
+    def __len__(self) -> int:
+        return self.rows * self.columns
+
+    def tile(self, index:int) -> np.ndarray:
+        """
+        View of the canvas of the tile at given index (row-major)
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("tile index out of range")
+        row, column = divmod(index, self.columns)
+        height, width = self.tile_shape
+        return self.canvas[row * height:(row + 1) * height, column * width:(column + 1) * width]
+
+    def update(self, index:int, image:np.ndarray) -> None:
+        """
+        Sets the image (None for an empty tile) of a tile, redrawn at the next
+        render
+        """
+        self.tile(index)
+        self._images[index] = image
+        self._dirty.add(index)
+
+    def invalidate(self, index:int=None) -> None:
+        """
+        Marks a tile (or all the tiles if None) to be redrawn at the next
+        render, eg. after its image has been modified in place
+        """
+        if index is None:
+            self._dirty.update(range(len(self)))
+        else:
+            self.tile(index)
+            self._dirty.add(index)
+
+    def render(self, images:list=None) -> np.ndarray:
+        """
+        Redraws the dirty tiles and returns the canvas (the same array at
+        each call)
+
+        Parameters
+        ----------
+        images : list or None
+            images of the first len(images) tiles (row-major, None for an
+            empty tile), only the ones that are not the same object of the
+            previous render are redrawn. None to render only the updates
+
+        Returns
+        -------
+        numpy.ndarray
+            the canvas
+        """
+        if images is not None:
+            if len(images) > len(self):
+                raise ValueError(f"Too many images for a grid of {len(self)} tiles")
+            for index, image in enumerate(images):
+                if image is not self._images[index]:
+                    self._images[index] = image
+                    self._dirty.add(index)
+
+        dirty, self._dirty = sorted(self._dirty), set()
+        if len(dirty) > 1 and self.max_workers != 1:
+            if self._executor is None:
+                import concurrent.futures
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+            # consumed to raise the exceptions of the workers
+            list(self._executor.map(self._render_tile, dirty))
+        else:
+            for index in dirty:
+                self._render_tile(index)
+        return self.canvas
+
+    def _render_tile(self, index:int) -> None:
+        tile = self.tile(index)
+        img = self._images[index]
+        if img is None:
+            tile[:] = self.background
+            self._drawn_shapes[index] = None
+            return
+        if img.dtype != np.uint8:
+            raise ValueError("Only uint8 images are supported")
+        if len(img.shape) < 3 or img.shape[2] == 1:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        elif img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+        ratio, dsize, (row_start, col_start) = _resize_plan(img.shape[0], img.shape[1], tile.shape[1], tile.shape[0])
+        if self._drawn_shapes[index] != img.shape[:2]:
+            tile[:] = self.background
+            self._drawn_shapes[index] = img.shape[:2]
+        roi = tile[row_start:row_start + dsize[1], col_start:col_start + dsize[0]]
+        cv2.resize(img, dsize=None, dst=roi, fx=ratio, fy=ratio, interpolation=self.interpolation)
+
+    def close(self) -> None:
+        """
+        Shuts down the thread pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def extract_and_straighten_image(source_image:np.ndarray, corners:list, width:int, height:int) -> tuple[np.ndarray, np.ndarray]:
     if len(corners) != 4 or any(len(pt) != 2 for pt in corners):
         raise ValueError("Corners must be a list of size = 4 and each element must be of size = 2")
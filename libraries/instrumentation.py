@@ -0,0 +1,313 @@
+"""
+Low-overhead instrumentation of hot paths.
+
+Code is instrumented with `@timed` functions, `with span("name")` blocks
+and `count("name")` counters, that do (almost) nothing until a profiler is
+enabled with `enable`. The enabled profiler keeps for each span the
+number of calls, the total, min and max time and a histogram with
+power-of-two buckets (for percentiles), and optionally the single
+events to be written as a Chrome trace JSON (open it in chrome://tracing
+or https://ui.perfetto.dev). In sampling mode only one call every N of
+each span is timed, to reduce the overhead on very hot paths.
+
+Scripts get a `--profile` option with `add_profile_argument` and
+`enable_from_argument`: `--profile` prints a summary table at exit,
+`--profile trace.json` writes the Chrome trace.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+
+class _SpanStats:
+
+    __slots__ = ("calls", "timed", "total", "min", "max", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.timed = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        # bucket i counts the durations in [2^(i-1), 2^i) ns
+        self.histogram = [0] * 64
+
+    def add(self, duration:int) -> None:
+        self.timed += 1
+        self.total += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        self.histogram[min(63, duration.bit_length())] += 1
+
+    def percentile(self, percentile:float) -> int:
+        """
+        Upper edge (in ns) of the histogram bucket that contains the percentile
+        """
+        target = self.timed * percentile / 100
+        cumulative = 0
+        for index, count in enumerate(self.histogram):
+            cumulative += count
+            if count and cumulative >= target:
+                return min(self.max, 1 << index)
+        return self.max
+
+
+class _Span:
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name:str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+
+
+class _NullSpan:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Collects the statistics (and optionally the trace events) of the spans
+    and the values of the counters
+    """
+
+    def __init__(self, sample_every:int=1, trace:bool=False, max_events:int=1000000):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        sample_every : int
+            time only one call every sample_every of each span (1 = all),
+            the number of calls is always exact
+        trace : bool
+            if True the events are kept to be written as Chrome trace
+        max_events : int
+            max number of trace events kept, the following are discarded
+        """
+        if sample_every < 1:
+            raise ValueError("sample_every must be a positive integer")
+        self.sample_every = sample_every
+        self.trace = trace
+        self.max_events = max_events
+        self.spans = {}
+        self.counters = {}
+        self.events = []
+        self.start = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def span(self, name:str):
+        if self.sample_every > 1:
+            with self._lock:
+                stats = self.spans.get(name)
+                if stats is not None and (stats.calls + 1) % self.sample_every:
+                    # not timed calls are only counted
+                    stats.calls += 1
+                    return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name:str, start:int, end:int) -> None:
+        """
+        Adds a call of a span, with start and end in ns (time.perf_counter_ns)
+        """
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = _SpanStats()
+            stats.calls += 1
+            stats.add(end - start)
+            if self.trace and len(self.events) < self.max_events:
+                self.events.append((name, start, end - start, threading.get_ident()))
+
+    def count(self, name:str, n:int=1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> list:
+        """
+        Statistics of each span as list of dicts, times in seconds, sorted by
+        estimated total time (the sampled time scaled to all the calls)
+        """
+        rows = []
+        for name, stats in self.spans.items():
+            mean = stats.total / stats.timed / 1e9
+            rows.append({
+                "name": name,
+                "calls": stats.calls,
+                "timed": stats.timed,
+                "total": mean * stats.calls,
+                "mean": mean,
+                "min": stats.min / 1e9,
+                "p50": stats.percentile(50) / 1e9,
+                "p99": stats.percentile(99) / 1e9,
+                "max": stats.max / 1e9,
+            })
+        return sorted(rows, key=lambda row: -row["total"])
+
+    def print_summary(self, file=None) -> None:
+        file = sys.stderr if file is None else file
+        elapsed = (time.perf_counter_ns() - self.start) / 1e9
+        rows = self.summary()
+        width = max([len(row["name"]) for row in rows] + [len(name) for name in self.counters] + [4])
+        print(f"\nProfile ({elapsed:.3f} s elapsed{'' if self.sample_every == 1 else f', 1 call every {self.sample_every} timed'})", file=file)
+        if rows:
+            print(f"{'span':<{width}} {'calls':>9} {'total s':>9} {'%':>6} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}", file=file)
+            for row in rows:
+                print(f"{row['name']:<{width}} {row['calls']:>9} {row['total']:>9.3f} {100 * row['total'] / elapsed:>6.1f} " +
+                      " ".join(f"{row[key] * 1e3:>9.3f}" for key in ("mean", "p50", "p99", "max")), file=file)
+        if self.counters:
+            print(f"{'counter':<{width}} {'value':>9}", file=file)
+            for name, value in sorted(self.counters.items()):
+                print(f"{name:<{width}} {value:>9}", file=file)
+
+    def write_chrome_trace(self, path:str) -> None:
+        """
+        Writes the trace events (requires trace=True) and the counters in the
+        Chrome trace JSON format
+        """
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (start - self.start) / 1000, "dur": duration / 1000, "pid": pid, "tid": tid}
+                  for name, start, duration, tid in self.events]
+        end = (time.perf_counter_ns() - self.start) / 1000
+        events += [{"name": name, "ph": "C", "ts": end, "pid": pid, "args": {name: value}}
+                   for name, value in self.counters.items()]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+_profiler = None
+
+
+def enable(sample_every:int=1, trace:bool=False, max_events:int=1000000) -> Profiler:
+    """
+    Enables the instrumentation with a new profiler, that is returned
+    """
+    global _profiler
+    _profiler = Profiler(sample_every, trace, max_events)
+    return _profiler
+
+
+def disable() -> Profiler:
+    """
+    Disables the instrumentation and returns the profiler used until now
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def get_profiler() -> Profiler:
+    """
+    Returns the current profiler, None when disabled
+    """
+    return _profiler
+
+
+def span(name:str):
+    """
+    Context manager that times the enclosed block as a span of given name
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.span(name)
+
+
+def count(name:str, n:int=1) -> None:
+    """
+    Adds n to the counter of given name
+    """
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+
+def timed(function=None, *, name:str=None):
+    """
+    Decorator that times each call of a function as a span, named as the
+    function unless name is given. Usable as `@timed` or `@timed(name=...)`
+    """
+    if function is None:
+        return functools.partial(timed, name=name)
+    span_name = function.__qualname__ if name is None else name
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _profiler is None:
+            return function(*args, **kwargs)
+        with _profiler.span(span_name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def add_profile_argument(parser) -> None:
+    """
+    Adds the --profile option to an argparse.ArgumentParser
+    """
+    parser.add_argument("--profile", type=str, nargs="?", const="summary", default=None, metavar="TRACE_JSON",
+        help="Profile the run: print a summary table at exit, or write a Chrome trace if a .json path is given")
+    parser.add_argument("--profile-sample", type=int, default=1, metavar="N",
+        help="With --profile, time only one call every N of each span (default = 1, all)")
+
+
+def profile_from_argv(argv:list):
+    """
+    Returns the value of --profile (see `add_profile_argument`) from a raw
+    list of arguments, for scripts that don't use argparse, and removes it
+    from the list. None if not present
+    """
+    for i, arg in enumerate(argv):
+        if arg == "--profile":
+            value = "summary"
+            if i + 1 < len(argv) and argv[i + 1].endswith(".json"):
+                value = argv.pop(i + 1)
+            argv.pop(i)
+            return value
+        if arg.startswith("--profile="):
+            argv.pop(i)
+            return arg.split("=", 1)[1]
+    return None
+
+
+def enable_from_argument(profile:str, sample_every:int=1) -> Profiler:
+    """
+    Enables the instrumentation according to the value of --profile, the
+    summary is printed (or the trace written) at exit. Returns None if
+    profile is None
+    """
+    if profile is None:
+        return None
+    profiler = enable(sample_every, trace=profile != "summary")
+
+    def report():
+        if profile == "summary":
+            profiler.print_summary()
+        else:
+            profiler.write_chrome_trace(profile)
+            print(f"\nProfile trace written to '{profile}'", file=sys.stderr)
+
+    atexit.register(report)
+    return profiler
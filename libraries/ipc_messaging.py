@@ -0,0 +1,328 @@
+"""
+Batched IPC messaging over multiprocessing Pipes and Queues, with zero-copy
+transfer of big buffers.
+
+`MessageChannel` wraps a `multiprocessing.Pipe` connection or a
+`multiprocessing.Queue` and serializes the messages with pickle protocol
+5. Big buffers inside the messages (NumPy arrays, bytes, bytearray...)
+are not copied into the pickle stream but sent out-of-band: on Pipes they
+are written directly to the connection and received into preallocated
+buffers, on Queues they are moved through shared memory blocks that the
+receiver maps without copying (pickled with the frame on Windows). Small messages are coalesced into batches
+to reduce the number of system calls, and the receiver can drain many
+messages with a single call. Each channel keeps throughput counters.
+"""
+
+import collections
+import io
+import os
+import pickle
+import queue
+import sys
+import time
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.queues
+from multiprocessing import shared_memory
+
+
+_PIPE_TYPE = multiprocessing.connection.PipeConnection if os.name == 'nt' else multiprocessing.connection.Connection
+
+
+class _Pickler(pickle.Pickler):
+    # bytes are always serialized in-band (the C pickler does not even call
+    # reducer_override for them), big ones are turned into persistent ids
+    # holding an out-of-band buffer
+    def __init__(self, file, threshold:int, buffer_callback):
+        super().__init__(file, protocol=5, buffer_callback=buffer_callback)
+        self.threshold = threshold
+
+    def persistent_id(self, obj):
+        if type(obj) is bytes and len(obj) >= self.threshold:
+            return pickle.PickleBuffer(obj)
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+
+    def persistent_load(self, pid):
+        return bytes(pid)
+
+
+def _loads(payload:bytes, buffers=None):
+    return _Unpickler(io.BytesIO(payload), buffers=buffers).load()
+
+
+def _to_shared_memory(buffer:pickle.PickleBuffer) -> tuple:
+    """
+    Copies a buffer into a new shared memory block whose ownership passes
+    to the receiver (the sender does not track it)
+    """
+    raw = buffer.raw()
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(create=True, size=max(1, raw.nbytes), track=False)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(1, raw.nbytes))
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            # the constructor registers the name with the leading slash
+            resource_tracker.unregister("/" + shm.name, "shared_memory")
+    shm.buf[:raw.nbytes] = raw
+    name = shm.name
+    # on POSIX the block lives until the receiver unlinks it
+    shm.close()
+    return name, raw.nbytes
+
+
+# received blocks still mapped, each one is closed once no view of its buffer is alive
+_mapped_blocks = []
+
+
+def _close_unused_blocks() -> None:
+    for shm in list(_mapped_blocks):
+        try:
+            shm.close()
+        except BufferError:
+            continue
+        _mapped_blocks.remove(shm)
+
+
+def _from_shared_memory(name:str, size:int) -> memoryview:
+    """
+    Maps a shared memory block received from another process and destroys
+    its name, the block is unmapped by a later call once the returned view
+    is not used anymore
+    """
+    _close_unused_blocks()
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        # registered by the constructor and unregistered by unlink
+        shm = shared_memory.SharedMemory(name=name)
+    shm.unlink()
+    _mapped_blocks.append(shm)
+    return shm.buf[:size]
+
+
+class MessageChannel:
+    """
+    Batched and zero-copy messaging over a Pipe connection or a Queue
+
+    Notes
+    -----
+    Messages with big buffers are sent immediately, the small ones are
+    kept in a batch that is sent when it reaches `batch_size` messages or
+    `batch_bytes` bytes, or when `flush` is called (also used as context
+    manager). Both ends of the channel must use a MessageChannel. A
+    MessageChannel is not thread-safe
+    """
+
+    def __init__(self, channel, batch_size:int=32, batch_bytes:int=65536, oob_threshold:int=16384,
+                 use_shared_memory:bool=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        channel : multiprocessing.PipeConnection or multiprocessing.Queue
+            the channel to be wrapped
+        batch_size : int
+            max number of small messages coalesced in a single batch
+            (1 to send every message immediately)
+        batch_bytes : int
+            max size in bytes of a batch of small messages
+        oob_threshold : int
+            min size in bytes of a buffer to be sent out-of-band
+        use_shared_memory : bool or None
+            send the out-of-band buffers through shared memory, if None it
+            is used only for Queues (Pipes can send them directly). Not
+            supported on Windows, where a block is destroyed as soon as the
+            sender closes it
+        """
+        if isinstance(channel, _PIPE_TYPE):
+            self._is_pipe = True
+        elif isinstance(channel, multiprocessing.queues.Queue):
+            self._is_pipe = False
+        else:
+            raise NotImplementedError(f"channel of type {type(channel)} is not supported")
+        self.channel = channel
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.oob_threshold = oob_threshold
+        if use_shared_memory is None:
+            use_shared_memory = not self._is_pipe and os.name != 'nt'
+        elif use_shared_memory and os.name == 'nt':
+            raise ValueError("use_shared_memory is not supported on Windows")
+        self.use_shared_memory = use_shared_memory
+        self._batch = []
+        self._batch_size_bytes = 0
+        self._received = collections.deque()
+        self.reset_stats()
+
+    # SENDING ######################################################
+
+    def _dumps(self, msg) -> tuple:
+        buffers = []
+
+        def buffer_callback(buffer):
+            if buffer.raw().nbytes < self.oob_threshold:
+                return True
+            buffers.append(buffer)
+            return False
+
+        file = io.BytesIO()
+        _Pickler(file, self.oob_threshold, buffer_callback).dump(msg)
+        return file.getvalue(), buffers
+
+    def _put(self, frame) -> None:
+        if self._is_pipe:
+            self.channel.send_bytes(pickle.dumps(frame, protocol=5))
+        else:
+            self.channel.put(frame)
+
+    def send(self, msg) -> None:
+        """
+        Sends a message (any picklable object), small messages may wait in
+        the current batch until it is full or `flush` is called
+        """
+        payload, buffers = self._dumps(msg)
+        self._stats["messages_sent"] += 1
+        self._stats["bytes_sent"] += len(payload)
+        if not buffers:
+            self._batch.append(payload)
+            self._batch_size_bytes += len(payload)
+            if len(self._batch) >= self.batch_size or self._batch_size_bytes >= self.batch_bytes:
+                self.flush()
+            return
+
+        # keeps the order of the messages
+        self.flush()
+        self._stats["oob_buffers_sent"] += len(buffers)
+        self._stats["bytes_sent"] += sum(buffer.raw().nbytes for buffer in buffers)
+        if self.use_shared_memory:
+            self._put(("shm", payload, [_to_shared_memory(buffer) for buffer in buffers]))
+        elif self._is_pipe:
+            self._put(("oob", payload, [buffer.raw().nbytes for buffer in buffers]))
+            for buffer in buffers:
+                self.channel.send_bytes(buffer.raw())
+        else:
+            # Queues cannot send raw buffers, they are pickled with the frame
+            self._put(("oob", payload, [buffer.raw().tobytes() for buffer in buffers]))
+
+    def flush(self) -> None:
+        """
+        Sends the current batch of small messages
+        """
+        if not self._batch:
+            return
+        self._put(("batch", self._batch))
+        self._stats["batches_sent"] += 1
+        self._batch = []
+        self._batch_size_bytes = 0
+
+    # RECEIVING ####################################################
+
+    def _decode(self, frame) -> None:
+        kind, *content = frame
+        if kind == "batch":
+            for payload in content[0]:
+                self._received.append(_loads(payload))
+                self._stats["bytes_received"] += len(payload)
+            return
+        payload, sizes = content
+        if kind == "shm":
+            buffers = [_from_shared_memory(name, size) for name, size in sizes]
+        elif self._is_pipe:
+            buffers = []
+            for size in sizes:
+                buffer = bytearray(size)
+                self.channel.recv_bytes_into(buffer)
+                buffers.append(buffer)
+        else:
+            buffers = sizes
+        self._stats["bytes_received"] += len(payload) + sum(len(memoryview(b)) for b in buffers)
+        self._received.append(_loads(payload, buffers))
+
+    def _get(self, timeout:float):
+        """
+        Reads a single frame from the channel, None if nothing arrives in time
+        """
+        if self._is_pipe:
+            if self.channel.poll(timeout):
+                return pickle.loads(self.channel.recv_bytes())
+            return None
+        try:
+            if timeout is not None and timeout <= 0:
+                return self.channel.get_nowait()
+            return self.channel.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def receive_many(self, max_n:int=None, timeout:float=0) -> list:
+        """
+        Receives the messages already available, up to `max_n`
+
+        Parameters
+        ----------
+        max_n : int or None
+            max number of messages to be returned, None for no limit
+        timeout : float or None
+            seconds to wait if no message is available (0 = don't wait,
+            None = forever). Once something is received the available
+            messages are drained without waiting
+
+        Returns
+        -------
+        list
+            the received messages, in order (may be empty)
+        """
+        wait = timeout
+        while max_n is None or len(self._received) < max_n:
+            frame = self._get(wait)
+            if frame is None:
+                break
+            self._decode(frame)
+            wait = 0
+        count = len(self._received) if max_n is None else min(max_n, len(self._received))
+        messages = [self._received.popleft() for _ in range(count)]
+        self._stats["messages_received"] += len(messages)
+        return messages
+
+    def receive_all(self) -> list:
+        """
+        Receives all the messages already available, without waiting
+        """
+        return self.receive_many(None, 0)
+
+    def receive(self, timeout:float=0):
+        """
+        Receives a single message, None if there is none (see `receive_many`)
+        """
+        messages = self.receive_many(1, timeout)
+        return messages[0] if messages else None
+
+    # STATS ########################################################
+
+    def reset_stats(self) -> None:
+        self._stats = collections.Counter(messages_sent=0, batches_sent=0, oob_buffers_sent=0, bytes_sent=0,
+                                          messages_received=0, bytes_received=0)
+        self._stats_start = time.perf_counter()
+
+    def stats(self) -> dict:
+        """
+        Counters of the channel since its creation (or `reset_stats`), plus
+        the throughput in messages/s and MB/s in both directions
+        """
+        elapsed = max(1e-9, time.perf_counter() - self._stats_start)
+        stats = dict(self._stats, elapsed=elapsed)
+        stats["sent_msg_per_s"] = stats["messages_sent"] / elapsed
+        stats["sent_mb_per_s"] = stats["bytes_sent"] / 2**20 / elapsed
+        stats["received_msg_per_s"] = stats["messages_received"] / elapsed
+        stats["received_mb_per_s"] = stats["bytes_received"] / 2**20 / elapsed
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
@@ -0,0 +1,434 @@
+"""
+Typed NumPy arrays in shared memory, for passing data between processes
+without pickling or copying it.
+
+`SharedArray` is a NumPy array (any dtype and shape) living in a named
+block of `multiprocessing.shared_memory`. Dtype and shape are stored in
+a small header inside the block itself, so any other process (even an
+unrelated one) can attach to it knowing only its name.
+
+`SharedArrayPool` keeps released arrays to reuse them for the next
+request with the same shape and dtype, avoiding to create and destroy
+shared memory blocks continuously.
+
+`FrameRing` is a lock-free single-producer/multi-consumer ring buffer of
+frames (eg. video frames) with sequence numbers. The producer writes the
+frames directly in shared memory and each consumer reads them at its own
+pace, detecting the frames that were overwritten before being read.
+"""
+
+import json
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+_MAGIC = b"SHNP"
+_HEADER_SIZE = 256    # magic, json length, json with dtype and shape (data is 64-byte aligned after this)
+
+
+def _dtype_descr(dtype:np.dtype):
+    return np.lib.format.dtype_to_descr(np.dtype(dtype))
+
+
+def _descr_dtype(descr) -> np.dtype:
+    # json turns the tuples of structured dtypes descriptions into lists
+    return np.lib.format.descr_to_dtype(descr if isinstance(descr, str) else [tuple(field) for field in descr])
+
+
+def _write_header(buf, info:dict) -> None:
+    payload = json.dumps(info).encode()
+    if len(payload) > _HEADER_SIZE - 8:
+        raise ValueError("dtype description too long to be stored in the header")
+    buf[:8 + len(payload)] = _MAGIC + struct.pack("<I", len(payload)) + payload
+
+
+def _read_header(buf) -> dict:
+    if bytes(buf[:4]) != _MAGIC:
+        raise ValueError("shared memory block was not created by this library")
+    length = struct.unpack("<I", bytes(buf[4:8]))[0]
+    return json.loads(bytes(buf[8:8 + length]).decode())
+
+
+_attach_lock = threading.Lock()
+
+
+def _attach(name:str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing block without registering it with the resource
+    tracker of this process, like the owner never does for the other
+    processes: the tracker would destroy the block when this process exits,
+    and unregistering it afterwards would remove the registration of the
+    owner too when the tracker is shared (same process or its children)
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # track is missing before 3.13, the registration done by the constructor is skipped
+    from multiprocessing import resource_tracker
+    with _attach_lock:
+        register = resource_tracker.register
+
+        def register_others(resource_name, resource_type):
+            if resource_type != "shared_memory":
+                register(resource_name, resource_type)
+
+        resource_tracker.register = register_others
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedArray:
+    """
+    NumPy array stored in a named shared memory block
+
+    Notes
+    -----
+    The process that creates the array owns it and should `unlink` it when
+    it is not needed anymore, the other processes only `close` it. The
+    `array` attribute must not be used after `close`
+    """
+
+    def __init__(self, shm:shared_memory.SharedMemory, owner:bool):
+        info = _read_header(shm.buf)
+        self._shm = shm
+        self.owner = owner
+        self.shape = tuple(info["shape"])
+        self.dtype = _descr_dtype(info["descr"])
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf, offset=_HEADER_SIZE)
+
+    @classmethod
+    def create(cls, shape, dtype=np.uint8, name:str=None) -> "SharedArray":
+        """
+        Creates a new shared array (zero initialized)
+
+        Parameters
+        ----------
+        shape : int or tuple
+            shape of the array
+        dtype : numpy.dtype
+            any NumPy dtype (structured dtypes included)
+        name : str or None
+            name of the shared memory block, None for a random unique one
+
+        Returns
+        -------
+        SharedArray
+            the new shared array, owned by the calling process
+        """
+        shape = (shape,) if isinstance(shape, int) else tuple(int(x) for x in shape)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + max(1, size))
+        _write_header(shm.buf, dict(descr=_dtype_descr(dtype), shape=shape))
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name:str) -> "SharedArray":
+        """
+        Attaches to a shared array created by any process, knowing only its name
+        """
+        return cls(_attach(name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self) -> None:
+        """
+        Detaches the array from this process (the data is kept alive)
+        """
+        self.array = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        Destroys the shared memory block, once every process has closed it
+        """
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    def __repr__(self):
+        return f"SharedArray(name={self.name!r}, shape={self.shape}, dtype={self.dtype})"
+
+
+class SharedArrayPool:
+    """
+    Pool of shared arrays that are reused instead of being destroyed
+
+    Notes
+    -----
+    `acquire` returns a released array with the same shape and dtype if
+    available, else it creates a new one. At most `max_free` released
+    arrays are kept for each (shape, dtype), the others are destroyed
+    """
+
+    def __init__(self, max_free:int=8):
+        self.max_free = max_free
+        self._free = {}
+        self._used = {}
+
+    @staticmethod
+    def _key(shape, dtype):
+        shape = (shape,) if isinstance(shape, int) else tuple(int(x) for x in shape)
+        return shape, np.dtype(dtype).str
+
+    def acquire(self, shape, dtype=np.uint8) -> SharedArray:
+        key = self._key(shape, dtype)
+        free = self._free.get(key)
+        shared = free.pop() if free else SharedArray.create(shape, dtype)
+        self._used[shared.name] = shared
+        return shared
+
+    def release(self, shared:SharedArray) -> None:
+        if self._used.pop(shared.name, None) is None:
+            raise ValueError(f"{shared} does not belong to this pool")
+        free = self._free.setdefault(self._key(shared.shape, shared.dtype), [])
+        if len(free) < self.max_free:
+            free.append(shared)
+        else:
+            shared.close()
+            shared.unlink()
+
+    def close(self) -> None:
+        """
+        Destroys all the arrays of the pool, the used ones included
+        """
+        for shared in [x for free in self._free.values() for x in free] + list(self._used.values()):
+            shared.close()
+            shared.unlink()
+        self._free.clear()
+        self._used.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FrameRing:
+    """
+    Lock-free single-producer/multi-consumer ring buffer of frames in shared memory
+
+    Notes
+    -----
+    Each slot has a sequence number used as a seqlock: it is odd while the
+    producer is writing the slot and even (twice the frame sequence number)
+    once the frame is complete, so consumers can detect frames that were
+    being written or got overwritten while they were reading them without
+    any lock. Frame sequence numbers start from 1
+    """
+
+    def __init__(self, shared:SharedArray, frame_shape:tuple, frame_dtype:np.dtype):
+        self._shared = shared
+        capacity = shared.shape[0]
+        self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        self.frame_dtype = np.dtype(frame_dtype)
+        frame_size = int(np.prod(self.frame_shape)) * self.frame_dtype.itemsize
+        raw = shared.array
+        # row layout: [ sequence number (8 bytes) | padding | frame ], each row 64-byte aligned
+        self._sequences = raw[:, :8].view(np.uint64).reshape(capacity)
+        self._frames = raw[:, 64:64 + frame_size].view(self.frame_dtype).reshape((capacity,) + self.frame_shape)
+        self._head = np.ndarray((1,), dtype=np.uint64, buffer=shared._shm.buf,
+                                offset=_HEADER_SIZE + raw.nbytes)
+        self._writing = None
+
+    @staticmethod
+    def _row_size(frame_shape, frame_dtype) -> int:
+        frame_size = int(np.prod(frame_shape)) * np.dtype(frame_dtype).itemsize
+        return 64 + -(-frame_size // 64) * 64
+
+    @classmethod
+    def create(cls, capacity:int, frame_shape:tuple, frame_dtype=np.uint8, name:str=None) -> "FrameRing":
+        """
+        Creates a new ring buffer of `capacity` frames with given shape and dtype
+        """
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        frame_shape = tuple(int(x) for x in frame_shape)
+        row_size = cls._row_size(frame_shape, frame_dtype)
+        # the head sequence number is stored right after the rows
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + capacity * row_size + 8)
+        _write_header(shm.buf, dict(descr="|u1", shape=(capacity, row_size),
+                                    frame_descr=_dtype_descr(frame_dtype), frame_shape=frame_shape))
+        shm.buf[_HEADER_SIZE:] = bytes(len(shm.buf) - _HEADER_SIZE)
+        return cls(SharedArray(shm, owner=True), frame_shape, frame_dtype)
+
+    @classmethod
+    def attach(cls, name:str) -> "FrameRing":
+        """
+        Attaches to a ring buffer created by any process, knowing only its name
+        """
+        shm = _attach(name)
+        info = _read_header(shm.buf)
+        return cls(SharedArray(shm, owner=False), info["frame_shape"], _descr_dtype(info["frame_descr"]))
+
+    @property
+    def name(self) -> str:
+        return self._shared.name
+
+    @property
+    def head(self) -> int:
+        """
+        Sequence number of the last published frame (0 if none)
+        """
+        return int(self._head[0])
+
+    # PRODUCER #####################################################
+
+    def begin_write(self) -> np.ndarray:
+        """
+        Returns the slot where the next frame must be written in place (eg.
+        as `out` of an OpenCV function), then call `end_write` to publish it
+        """
+        sequence = self.head + 1
+        slot = sequence % self.capacity
+        self._sequences[slot] = 2 * sequence - 1
+        self._writing = sequence
+        return self._frames[slot]
+
+    def end_write(self) -> int:
+        """
+        Publishes the frame written in the slot returned by `begin_write`
+        and returns its sequence number
+        """
+        sequence = self._writing
+        if sequence is None:
+            raise RuntimeError("end_write called without begin_write")
+        self._sequences[sequence % self.capacity] = 2 * sequence
+        self._head[0] = sequence
+        self._writing = None
+        return sequence
+
+    def put(self, frame:np.ndarray) -> int:
+        """
+        Copies a frame in the next slot and publishes it, returns its sequence number
+        """
+        self.begin_write()[...] = frame
+        return self.end_write()
+
+    # CONSUMERS ####################################################
+
+    def read(self, sequence:int, out:np.ndarray=None):
+        """
+        Copies the frame with given sequence number
+
+        Returns
+        -------
+        numpy.ndarray or None
+            the frame (copied in `out` if given) or None if it is not
+            available anymore (overwritten) or not yet
+        """
+        slot = sequence % self.capacity
+        if self._sequences[slot] != 2 * sequence:
+            return None
+        if out is None:
+            out = self._frames[slot].copy()
+        else:
+            np.copyto(out, self._frames[slot])
+        if self._sequences[slot] != 2 * sequence:
+            return None
+        return out
+
+    def view(self, sequence:int):
+        """
+        Zero-copy view of the frame with given sequence number (or None).
+        The producer may overwrite it at any time, so check `is_valid`
+        after using it
+        """
+        slot = sequence % self.capacity
+        if self._sequences[slot] != 2 * sequence:
+            return None
+        return self._frames[slot]
+
+    def is_valid(self, sequence:int) -> bool:
+        return self._sequences[sequence % self.capacity] == 2 * sequence
+
+    def reader(self, start:str="latest") -> "FrameRingReader":
+        """
+        Creates a consumer cursor starting from the 'latest' frame published
+        or from the 'oldest' one still available
+        """
+        return FrameRingReader(self, start)
+
+    def close(self) -> None:
+        self._sequences = self._frames = self._head = None
+        self._shared.close()
+
+    def unlink(self) -> None:
+        self._shared.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        owner = self._shared.owner
+        self.close()
+        if owner:
+            self.unlink()
+
+
+class FrameRingReader:
+    """
+    Consumer cursor of a FrameRing, reads every frame in order (skipping
+    the ones overwritten before being read, which are counted in `dropped`)
+    """
+
+    def __init__(self, ring:FrameRing, start:str="latest"):
+        if start not in ("latest", "oldest"):
+            raise ValueError("start must be 'latest' or 'oldest'")
+        self.ring = ring
+        head = ring.head
+        self.next = max(1, head if start == "latest" else head - ring.capacity + 2)
+        self.dropped = 0
+
+    def get(self, out:np.ndarray=None, timeout:float=0, poll:float=0.0005):
+        """
+        Copies the next frame
+
+        Parameters
+        ----------
+        out : numpy.ndarray or None
+            destination of the frame, a new array if None
+        timeout : float
+            max seconds to wait for a new frame (0 = don't wait, None = forever)
+        poll : float
+            sleep between two checks while waiting
+
+        Returns
+        -------
+        tuple (int, numpy.ndarray) or None
+            sequence number and frame, None if no new frame arrived in time
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            head = self.ring.head
+            if head >= self.next:
+                # frames more than capacity - 1 behind cannot be read safely anymore
+                oldest = head - self.ring.capacity + 2
+                if self.next < oldest:
+                    self.dropped += oldest - self.next
+                    self.next = oldest
+                sequence = self.next
+                frame = self.ring.read(sequence, out)
+                self.next += 1
+                if frame is not None:
+                    return sequence, frame
+                self.dropped += 1
+                continue
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            time.sleep(poll)
@@ -0,0 +1,268 @@
+"""
+Precise sleeping and fixed-rate loops with low CPU usage.
+
+`sleep_until` and `precise_sleep` use a hybrid strategy: the OS sleep is
+used until a small margin before the deadline, then the remaining time is
+spent busy-waiting. The margin is the OS sleep overshoot measured by
+`calibrate_sleep_margin` (once, at the first use), so most of the time is
+spent sleeping while still waking up on time.
+
+`Ticker` drives a loop at a fixed rate (eg. 1 kHz for polling loops)
+scheduling each tick on an absolute timeline to avoid drift, and
+`TimingStats` collects the jitter and overrun statistics of the loop in a
+fixed-size histogram (with percentiles like the p99).
+"""
+
+import time
+
+
+_sleep_margin = None
+
+
+def calibrate_sleep_margin(samples:int=30, duration:float=0.0005, percentile:float=99) -> float:
+    """
+    Measures how much the OS sleep overshoots short durations and stores it
+    as the default margin of `sleep_until` and `precise_sleep`
+
+    Parameters
+    ----------
+    samples : int
+        number of sleeps to be measured
+    duration : float
+        duration of each sleep in seconds
+    percentile : float
+        percentile of the measured overshoots to be used as margin
+
+    Returns
+    -------
+    float
+        the margin in seconds
+    """
+    global _sleep_margin
+    overshoots = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        time.sleep(duration)
+        overshoots.append(time.perf_counter() - start - duration)
+    overshoots.sort()
+    index = min(len(overshoots) - 1, int(len(overshoots) * percentile / 100))
+    # some headroom for the sleeps that go worse than the measured ones
+    _sleep_margin = max(0.0, overshoots[index]) * 1.25 + 5e-5
+    return _sleep_margin
+
+
+def sleep_until(deadline:float, margin:float=None, get_now=None) -> float:
+    """
+    Sleeps until the given deadline, sleeping with the OS until `margin`
+    seconds before it and then busy-waiting
+
+    Parameters
+    ----------
+    deadline : float
+        time to wake up at, in the timescale of `get_now`
+    margin : float or None
+        seconds spent busy-waiting before the deadline, None to use the
+        calibrated one (see `calibrate_sleep_margin`), 0 to only sleep and
+        float('inf') to only busy-wait
+    get_now : callable or None
+        function returning the current time in seconds, None to use
+        time.perf_counter
+
+    Returns
+    -------
+    float
+        the time of wake up
+    """
+    if get_now is None:
+        get_now = time.perf_counter
+    if margin is None:
+        margin = _sleep_margin if _sleep_margin is not None else calibrate_sleep_margin()
+    now = get_now()
+    remaining = deadline - now - margin
+    if remaining > 0:
+        time.sleep(remaining)
+        now = get_now()
+    while now < deadline:
+        now = get_now()
+    return now
+
+
+def precise_sleep(duration:float, margin:float=None, get_now=None) -> float:
+    """
+    Sleeps for the given duration in seconds with the precision of a busy-wait
+    but using the CPU only at the end of it (see `sleep_until`)
+    """
+    if get_now is None:
+        get_now = time.perf_counter
+    return sleep_until(get_now() + duration, margin, get_now)
+
+
+class TimingStats:
+    """
+    Statistics of a series of durations (eg. loop jitter) in a fixed-size
+    histogram, so that recording is O(1) and memory is constant
+    """
+
+    # the resolution is widened if needed to keep the histogram within this size
+    max_bins = 100000
+
+    def __init__(self, resolution:float=1e-5, max_value:float=0.01):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        resolution : float
+            width of each histogram bin in seconds, widened to
+            max_value / max_bins if smaller
+        max_value : float
+            upper limit of the histogram in seconds, bigger values are
+            counted in the last bin (but still used for max and mean)
+        """
+        self.resolution = max(resolution, max_value / self.max_bins)
+        self.histogram = [0] * (int(max_value / self.resolution) + 1)
+        self.reset()
+
+    def reset(self) -> None:
+        for i in range(len(self.histogram)):
+            self.histogram[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.overruns = 0
+
+    def record(self, value:float) -> None:
+        """
+        Adds a value in seconds, negative values are counted in the first bin
+        """
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        index = int(value / self.resolution)
+        histogram = self.histogram
+        histogram[0 if index < 0 else index if index < len(histogram) else -1] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile:float) -> float:
+        """
+        Returns the given percentile (0-100) of the recorded values in
+        seconds, as the upper edge of the histogram bin that contains it
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * percentile / 100
+        cumulative = 0
+        for index, count in enumerate(self.histogram):
+            cumulative += count
+            if cumulative >= target and count:
+                return min(self.max, (index + 1) * self.resolution)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "overruns": self.overruns,
+            "min": self.min if self.count else 0.0,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else 0.0,
+        }
+
+    def __str__(self) -> str:
+        summary = self.summary()
+        return (f"count={summary['count']} overruns={summary['overruns']} " +
+                " ".join(f"{key}={summary[key] * 1e6:.1f}us" for key in ("min", "mean", "p50", "p99", "max")))
+
+
+class Ticker:
+    """
+    Fixed-rate loop driver with drift compensation
+
+    Ticks are scheduled on an absolute timeline (start + n * period), so
+    the time spent in the loop body and the wake up delays don't
+    accumulate. If the body takes longer than a period the missed ticks
+    are counted as overruns and, unless `catch_up` is True, skipped.
+
+    Examples
+    --------
+    >>> for tick in Ticker(1000):    # 1 kHz
+    ...     poll_device()
+    """
+
+    def __init__(self, rate:float=None, period:float=None, margin:float=None, catch_up:bool=False,
+                 stats:bool=True, get_now=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        rate : float or None
+            ticks per second (alternative to period)
+        period : float or None
+            seconds between ticks (alternative to rate)
+        margin : float or None
+            busy-wait margin in seconds, see `sleep_until`
+        catch_up : bool
+            if True the missed ticks are run back to back after an overrun,
+            else the schedule jumps to the next tick in the future
+        stats : bool
+            if True the jitter (wake up delay) of each tick is recorded in
+            `self.stats`
+        get_now : callable or None
+            function returning the current time in seconds, None to use
+            time.perf_counter
+        """
+        if (rate is None) == (period is None):
+            raise ValueError("exactly one of rate and period must be given")
+        self.period = 1 / rate if period is None else period
+        if self.period <= 0:
+            raise ValueError("rate and period must be positive")
+        self.margin = margin
+        self.catch_up = catch_up
+        self.get_now = time.perf_counter if get_now is None else get_now
+        self.stats = TimingStats(resolution=min(1e-5, self.period / 100), max_value=10 * self.period) if stats else None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Restarts the schedule, the next tick happens immediately
+        """
+        self.count = 0
+        self._next = None
+
+    def tick(self) -> int:
+        """
+        Waits for the next tick and returns its index (the first one
+        returns immediately)
+        """
+        now = self.get_now()
+        if self._next is None:
+            self._next = now
+        elif now > self._next:
+            # overrun, the body took longer than the time left before this tick
+            missed = int((now - self._next) / self.period)
+            if missed and not self.catch_up:
+                self._next += missed * self.period
+                self.count += missed
+            if self.stats is not None:
+                self.stats.overruns += max(1, missed)
+        else:
+            now = sleep_until(self._next, self.margin, self.get_now)
+        if self.stats is not None:
+            self.stats.record(now - self._next)
+        index = self.count
+        self.count += 1
+        self._next += self.period
+        return index
+
+    def __iter__(self):
+        while True:
+            yield self.tick()
@@ -1,3 +1,71 @@
+import colorsys
+import functools
+import importlib
+import keyword
+import math
+import os
+import time
+
+
+class _LazyModule:
+    """
+    Placeholder of a module that is imported on first attribute access, then
+    the global variable holding the placeholder is replaced by the module
+    itself so that following accesses have no overhead
+    """
+
+    def __init__(self, name:str, variable:str):
+        self._name = name
+        self._variable = variable
+
+    def __getattr__(self, attribute:str):
+        module = importlib.import_module(self._name)
+        globals()[self._variable] = module
+        return getattr(module, attribute)
+
+
+# heavy modules, loaded when first used
+datetime = _LazyModule("datetime", "datetime")
+json = _LazyModule("json", "json")
+queue = _LazyModule("queue", "queue")
+random = _LazyModule("random", "random")
+np = _LazyModule("numpy", "np")
+ctypes = _LazyModule("ctypes", "ctypes")
+multiprocessing = _LazyModule("multiprocessing", "multiprocessing")
+_mp_connection = _LazyModule("multiprocessing.connection", "_mp_connection")
+_mp_queues = _LazyModule("multiprocessing.queues", "_mp_queues")
+
+
+@functools.lru_cache(maxsize=256)
+def _slotted_class(cls:type, keys:tuple) -> type:
+    """
+    Subclass of an ObjectFromDict class with a slot for each key that can
+    be an attribute, the least recently used ones are evicted so that many
+    different dictionaries don't grow the cache forever
+    """
+    slots = tuple(key for key in keys if isinstance(key, str) and key.isidentifier()
+                  and not keyword.iskeyword(key) and not hasattr(cls, key))
+    return type(cls.__name__, (cls,), {"__slots__": slots})
+
+
+def _convert_value(value):
+    """
+    Converts a value of ObjectFromDict into int or float if possible, dicts
+    (even inside lists) into nested ObjectFromDict
+    """
+    if isinstance(value, dict):
+        return ObjectFromDict(value)
+    if isinstance(value, list):
+        return [ObjectFromDict(item) if isinstance(item, dict) else item for item in value]
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        try:
+            return float(value)
+        except (TypeError, ValueError, OverflowError):
+            return value
+
+
 class ObjectFromDict:
     """
     Hacky way to convert a dictionary into an object with attributes
@@ -5,14 +73,25 @@ class ObjectFromDict:
     Notes
     -----
     All the attributes are from the dictionary (key, value) pairs and the
-    value is automatically converted to int or float if possible
+    value is automatically converted to int or float if possible, nested
+    dictionaries are converted into objects too
+
+    Values are converted only when first accessed and stored in the
+    __slots__ of a class generated (once) for each set of keys, so objects
+    are compact and attribute access is as fast as a normal attribute.
+    Since the objects have no __dict__, new attributes cannot be added
+    after construction (AttributeError) and vars(obj) raises TypeError,
+    keep the original dictionary to get all the values. Keys that are not
+    valid identifiers can be read only with getattr
 
     All the methods are from the dictionary (key, value) pairs (when value is
     a callable). Beware that all the added methods will behave as static
     methods and are not checked so use this at your own risk
     """
 
-    def __init__(self, dictionary:dict):
+    __slots__ = ("_raw",)
+
+    def __new__(cls, dictionary:dict):
         """
         Constructor
 
@@ -25,15 +104,29 @@ class ObjectFromDict:
         """
         if not isinstance(dictionary, dict):
             raise ValueError("argument 'dictionary' bust be of type 'dict'")
+        return cls._from_dict(dictionary)
+
+    @classmethod
+    def _from_dict(cls, dictionary:dict):
+        obj = object.__new__(_slotted_class(cls, tuple(dictionary)))
+        obj._raw = dict(dictionary)
+        return obj
+
+    def __getattr__(self, name:str):
+        # called only for the slots not yet filled (first access)
+        raw = object.__getattribute__(self, "_raw")
+        if name not in raw:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = _convert_value(raw[name])
+        if name in type(self).__slots__:
+            object.__setattr__(self, name, value)
+        return value
 
-        for key, value in dictionary.items():
-            try:
-                self.__dict__[key] = int(value)
-            except:
-                try:
-                    self.__dict__[key] = float(value)
-                except:
-                    self.__dict__[key] = value
+    def __reduce__(self):
+        return ObjectFromDict, ({key: getattr(self, key) for key in self._raw},)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(map(str, self._raw))})"
 
 
 class ObjectFromJSON(ObjectFromDict):
@@ -43,14 +136,22 @@ class ObjectFromJSON(ObjectFromDict):
     Notes
     -----
     All the attributes are from the JSON (key, value) pairs and the 
-    value is automatically converted to int or float if possible
+    value is automatically converted to int or float if possible (see
+    ObjectFromDict)
+
+    Parsed files are cached by path, modification time and size, so
+    creating many objects from the same file reads it only once (and again
+    only when it changes). Use `clear_cache` to force a new read
 
     All the methods are from the JSON (key, value) pairs (when value is a
     callable). Beware that all the added methods will behave as static methods
     and are not checked so use this at your own risk
     """
 
-    def __init__(self, json_path:str):
+    __slots__ = ()
+    _cache = {}
+
+    def __new__(cls, json_path:str):
         """
         Constructor
 
@@ -62,13 +163,28 @@ class ObjectFromJSON(ObjectFromDict):
             stored into them after automatic conversion into int or float
             if possible
         """
-        
-        import json
-        
-        with open(json_path, 'r') as file:
-            d = json.load(file)
-
-        super().__init__(d)
+        path = os.path.abspath(json_path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = ObjectFromJSON._cache.get(path)
+        if cached is None or cached[0] != version:
+            with open(path, 'r') as file:
+                d = json.load(file)
+            if not isinstance(d, dict):
+                raise ValueError(f"the JSON file '{json_path}' does not contain an object")
+            cached = ObjectFromJSON._cache[path] = (version, d)
+
+        return cls._from_dict(cached[1])
+
+    @staticmethod
+    def clear_cache(json_path:str=None) -> None:
+        """
+        Removes a file (or all the files if None) from the cache of parsed files
+        """
+        if json_path is None:
+            ObjectFromJSON._cache.clear()
+        else:
+            ObjectFromJSON._cache.pop(os.path.abspath(json_path), None)
 
 
 def make_chunks(lst:list, n:int, padding:bool=True) -> list:
@@ -76,42 +192,46 @@ def make_chunks(lst:list, n:int, padding:bool=True) -> list:
     Yield successive n-sized chunks from lst.
     If padding is true, the last chunks will contain
     None elements to make up for a n-size chunk
+    (lst is not modified). See the chunking library
+    for a lazy version working on any iterable
     '''
-    if padding and (rem := len(lst) % n):
-        lst.extend([None] * (n-rem))
     for i in range(0, len(lst), n):
-        yield lst[i:i + n]
+        chunk = lst[i:i + n]
+        if padding and len(chunk) < n:
+            chunk = chunk + [None] * (n - len(chunk))
+        yield chunk
 
 
 def get_timestamp(format:str="%Y%m%d_%H%M%S"):
-    # IMPORTS ########
-    import datetime
-    ##################
     return datetime.datetime.now().strftime(format)
 
 
-def precise_sleep(duration, get_now=None):
-    # IMPORTS ########
-    import time
-    ##################
-    now = time.perf_counter if get_now is None else get_now()
+def precise_sleep(duration, get_now=None, margin:float=0.002):
+    """
+    Sleeps for duration seconds: with the OS until margin seconds before the
+    end, then busy-waiting. get_now must return the current time in seconds
+    (None for time.perf_counter). The default margin of 2 ms covers the
+    usual oversleep of time.sleep, 0 only sleeps and a value bigger than
+    duration only busy-waits. See the timing library for a margin
+    calibrated on this machine and fixed-rate loops
+    """
+    if get_now is None:
+        get_now = time.perf_counter
+    now = get_now()
     end = now + duration
+    if duration > margin:
+        time.sleep(duration - margin)
+        now = get_now()
     while now < end:
         now = get_now()
 
 
 def hsv_color(hue, sat, value):
-    # IMPORTS ########
-    import colorsys
-    ##################
     """ hue : 0-360, sat : 0-1, value : 0-1 """
     return tuple(int(x * 255) for x in colorsys.hsv_to_rgb((hue % 360) / 360, sat, value))
 
 
 def color_generator(initial:int, step:int) -> tuple:
-    # IMPORTS ########
-    import colorsys
-    ##################
     hue = initial
     while True:
         yield tuple(int(x * 255) for x in colorsys.hsv_to_rgb(hue / 360, 1, 1))
@@ -135,9 +255,6 @@ def random_color(hashable=None):
     If hashable is present, the random color will be deterministic and 
     will be always the same for that object
     """
-    # IMPORTS ########
-    import random
-    ##################
     if hashable is None:
         seed = random.randint(0, 1e9-1)
     else:
@@ -166,44 +283,117 @@ def validate_color(color) -> tuple:
         return color
     
 
-def lerp(a, b, x):
-    return a + x * (b - a)
-    # return a * (1 - x) + b * x  # little slower but less susceptible to float errors when x = 1
+def _as_float_array(x):
+    x = np.asarray(x)
+    return x if np.issubdtype(x.dtype, np.floating) else x.astype(np.float64)
 
 
-def smooth_step(x, smoother=False):
-    x = max(0, min(1, x))
+def lerp(a, b, x, out=None):
+    """
+    Linear interpolation between a and b, works with scalars and NumPy
+    arrays (broadcast together). If out is given the result is written in it
+    """
+    if out is None:
+        return a + x * (b - a)
+        # return a * (1 - x) + b * x  # little slower but less susceptible to float errors when x = 1
+    if np.may_share_memory(out, a) or np.may_share_memory(out, x):
+        # a and x are read after out is first written, so a temporary is needed
+        difference = np.subtract(b, a)
+        difference *= x
+        return np.add(a, difference, out=out)
+    np.subtract(b, a, out=out)
+    out *= x
+    out += a
+    return out
+
+
+def smooth_step(x, smoother=False, out=None):
+    """
+    Smoothstep (or Smootherstep) of x clamped to 0-1, works with scalars
+    and NumPy arrays. If out is given the result is written in it
+    """
+    if out is None and isinstance(x, (int, float)):
+        x = max(0, min(1, x))
+        if smoother:
+            return ((6 * x - 15) * x + 10) * x**3 # Smootherstep: 6x^5 + 16x^4 + 10x^3
+        return (3 - 2 * x) * x**2 # Smoothstep: -2x^3 + 3x^2
+    x = np.clip(_as_float_array(x), 0, 1)
+    if out is None:
+        out = np.empty_like(x)
     if smoother:
-        return ((6 * x - 15) * x + 10) * x**3 # Smootherstep: 6x^5 + 16x^4 + 10x^3
-    return (3 - 2 * x) * x**2 # Smoothstep: -2x^3 + 3x^2
+        np.multiply(x, 6, out=out)
+        out -= 15
+        out *= x
+        out += 10
+        out *= x
+    else:
+        np.multiply(x, -2, out=out)
+        out += 3
+    out *= x
+    out *= x
+    return out
     
 
-def map_range(value, source_min:float, source_max:float, target_min:float, target_max:float) -> float:
-    return target_min + ((target_max - target_min) * (value - source_min) / (source_max - source_min))
+def map_range(value, source_min:float, source_max:float, target_min:float, target_max:float, out=None) -> float:
+    """
+    Maps value from the source range to the target range (without clamping),
+    works with scalars and NumPy arrays. If out is given the result is
+    written in it
+    """
+    if out is None:
+        return target_min + ((target_max - target_min) * (value - source_min) / (source_max - source_min))
+    np.subtract(value, source_min, out=out)
+    np.multiply(target_max - target_min, out, out=out)
+    np.divide(out, source_max - source_min, out=out)
+    return np.add(out, target_min, out=out)
 
 
-def generalized_smooth_step(x, N):
+_smooth_step_coefficients_cache = {}
+
+
+def _smooth_step_coefficients(N:int) -> tuple:
+    """
+    Coefficients of the generalized smoothstep of order N divided by
+    x^(N+1), from the highest power (x^N) to the constant term
+    """
+    coefficients = _smooth_step_coefficients_cache.get(N)
+    if coefficients is None:
+        # pascal(-N - 1, n) * pascal(2 * N + 1, N - n) with exact integers
+        coefficients = tuple((-1)**n * math.comb(N + n, n) * math.comb(2 * N + 1, N - n) for n in range(N, -1, -1))
+        _smooth_step_coefficients_cache[N] = coefficients
+    return coefficients
+
+
+def generalized_smooth_step(x, N, out=None):
     """
     Taken from Wikipedia implementation at https://en.wikipedia.org/wiki/Smoothstep
     N -> polynomial degree = 2N+1
-    """
-    def pascal(a, b):
-        result = 1
-        for i in range(b):
-            result *= (a - i) / (i + 1)
-        return result
-    
-    x = max(0, min(1, x))
 
-    result = 0
-    for n in range(N+1):
-        result += pascal(-N - 1, n) * pascal(2 * N + 1, N - n) * x**(N + n + 1)
-    
-    return result
+    Works with scalars and NumPy arrays (if out is given the result is
+    written in it). The coefficients are computed once for each N and the
+    polynomial is evaluated with Horner's scheme
+    """
+    coefficients = _smooth_step_coefficients(N)
+    if out is None and isinstance(x, (int, float)):
+        x = max(0, min(1, x))
+        result = 0
+        for coefficient in coefficients:
+            result = result * x + coefficient
+        return result * x**(N + 1)
+    # np.clip returns a NumPy scalar for NumPy scalars and 0-d arrays
+    x = np.asarray(np.clip(_as_float_array(x), 0, 1))
+    scalar = out is None and x.ndim == 0
+    if out is None:
+        out = np.empty_like(x)
+    out[...] = coefficients[0]
+    for coefficient in coefficients[1:]:
+        out *= x
+        out += coefficient
+    out *= np.power(x, N + 1, out=x)
+    return out[()] if scalar else out
 
 
 def extract_info_from_file_path(path:str):
-    import os
     parent = os.path.dirname(path)
     file_name = os.path.basename(path)
     *name, extension = file_name.split('.')
@@ -212,24 +402,15 @@ def extract_info_from_file_path(path:str):
 
 
 def find_best_arrangement(N):
-    best_wasted_space = float('inf')
-    best_width = 1
-    best_height = N
-
-    for width in range(1, N // 2):
-        height = (N + width - 1) // width
-
-        if width > height:
-            break
-
-        wasted_space = (width * height) - N
-
-        if wasted_space < best_wasted_space or (wasted_space == best_wasted_space and abs(width - height) < abs(best_width - best_height)):
-                best_wasted_space = wasted_space
-                best_width = width
-                best_height = height
-
-    return best_width, best_height
+    """
+    Returns the grid (width, height), with width <= height, that holds N
+    elements: the most square one with the least empty cells, computed in
+    constant time (height = ceil(sqrt(N)), width = ceil(N / height))
+    """
+    if N <= 0:
+        return 1, 0
+    height = math.isqrt(N - 1) + 1
+    return (N + height - 1) // height, height
 
 
 def create_shared_array(shape):
@@ -247,9 +428,6 @@ def create_shared_array(shape):
         the 1-dimensionale shared array with size equal to the product
         of each element of the shape tuple or list
     """
-    import multiprocessing
-    import ctypes
-    import numpy as np
     return multiprocessing.Array(ctypes.c_uint8, int(np.prod(shape)), lock=False)
 
 
@@ -272,7 +450,6 @@ def shared_to_numpy_array(shared_array, shape):
     numpy.ndarray
         the shared array interpreted as an n-dimensional array of given shape 
     """
-    import numpy as np
     buf = np.frombuffer(shared_array, dtype=np.uint8)
     buf = buf.reshape(shape)
     return buf
@@ -294,17 +471,16 @@ def send_ipc_message(channel, msg):
     NotImplementedError
         the channel type is not supported
     """
-    import multiprocessing
     
     if channel is None:
         return
 
-    pipe_instance = multiprocessing.connection.PipeConnection if os.name == 'nt' else multiprocessing.connection.Connection
+    pipe_instance = _mp_connection.PipeConnection if os.name == 'nt' else _mp_connection.Connection
 
     if isinstance(channel, pipe_instance):
         channel.send(msg)
         
-    elif isinstance(channel, multiprocessing.queues.Queue):
+    elif isinstance(channel, _mp_queues.Queue):
         channel.put_nowait(msg)
 
     else:
@@ -330,12 +506,11 @@ def receive_ipc_message(channel):
     NotImplementedError
         the channel type is not supported
     """
-    import multiprocessing
     
     if channel is None:
         return None
 
-    pipe_instance = multiprocessing.connection.PipeConnection if os.name == 'nt' else multiprocessing.connection.Connection
+    pipe_instance = _mp_connection.PipeConnection if os.name == 'nt' else _mp_connection.Connection
         
     if isinstance(channel, pipe_instance):
         if channel.poll(0):
@@ -343,7 +518,7 @@ def receive_ipc_message(channel):
         else:
             return None
 
-    elif isinstance(channel, multiprocessing.queues.Queue):
+    elif isinstance(channel, _mp_queues.Queue):
         try:
             return channel.get_nowait()
         except queue.Empty:
@@ -372,7 +547,6 @@ def logged_print(*args, tag:str=None, just:int=8, time_format:str="%Y-%m-%d %H:%
     -----
     same parameters as `print`
     """
-    import datetime
     timestamp = "[ " + datetime.datetime.now().strftime(time_format) + " ]"
     logtag = "" if tag == None else "[ " + tag.ljust(just) + " ]"
     print(timestamp, logtag, *args, **kwargs)
@@ -3,10 +3,24 @@ import sys, os
 """
 Bulk convert all supported images in the current folder to PNG
 
-Usage: place it in the folder you'd like to process and run `python all2png.py [y]`
+Usage: place it in the folder you'd like to process and run `python all2png.py [y] [--profile [trace.json]]`
        use option `y` to automatically overwrite existing PNG files with same name
+       use option `--profile` to print where the time goes at the end (or write a Chrome trace)
 """
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+try:
+    from libraries import instrumentation
+    from libraries.instrumentation import span
+except ImportError:
+    # the script can be copied alone in the folder to be processed
+    instrumentation = None
+    from contextlib import nullcontext as span
+
+profile = None if instrumentation is None else instrumentation.profile_from_argv(sys.argv)
+if profile is not None:
+    instrumentation.enable_from_argument(profile)
+
 supported_file_format = ["tif", "tiff", "jpg", "jpeg", "bmp", "tga"]
 
 auto_overwrite = True if len(sys.argv) > 1 and sys.argv[1].lower() == "y" else False
@@ -22,9 +36,12 @@ error_list = list()
 for i, file in enumerate(file_list):
     new_name = ".".join(file.split(".")[:-1]) + ".png"
     print(f"Processing {i + 1}/{file_list_len}: {file} -> {new_name}")
-    error = os.system(f"{ffmpeg_command} -i {file} {new_name}")
+    with span("ffmpeg"):
+        error = os.system(f"{ffmpeg_command} -i {file} {new_name}")
     if (error):
         error_list.append(file)
+        if instrumentation is not None:
+            instrumentation.count("ffmpeg errors")
         if os.path.exists(new_name): 
             os.remove(new_name)
 
@@ -0,0 +1,355 @@
+'''
+bit_stream_benchmark
+
+Benchmarks for the bit_stream library, with three commands:
+
+codecs: compares the codecs of the bit_stream library (Huffman and range
+coder) against zlib on the same data, reporting compression ratio and
+encode/decode throughput (MB/s). Binary data (only 0 and 1 values) is
+range coded with the context-modelled binary coder.
+
+suite: measures the throughput of the BitStream hot paths (put of single
+bits and small ints, putchar of strings, export, str, + and *) and the
+peak memory per million bits, for stream sizes from 1 KB up to 1 GB.
+It only uses the original BitStream API, so it can also run on the
+bit_stream.py of any git revision, and it can write a JSON report.
+
+compare: compares two JSON reports of the suite and lists the measures
+that got slower (or bigger) than a threshold, exiting with status 1 if
+there is any regression.
+
+Usage:
+
+python bit_stream_benchmark.py codecs [options]
+python bit_stream_benchmark.py suite [options]
+python bit_stream_benchmark.py compare old.json new.json [options]
+
+[codecs options]
+--input/-i: file to be used as data (default = generated data)
+--data: kind of generated data, 'zipf', 'uniform' or 'binary' (default = zipf)
+--size/-s: size in bytes of the generated data (default = 262144)
+--repeat/-r: number of runs for each measure, the best one is kept (default = 3)
+--seed: seed for the generated data (default = 0)
+
+[suite options]
+--sizes: comma separated stream sizes, with K/M/G suffixes (default = 1K,64K,1M)
+--max-ops: max number of calls measured by the put cases (default = 200000)
+--repeat/-r: number of runs for each measure, the best one is kept (default = 3)
+--revision: git revision of bit_stream.py to be measured (default = working tree)
+--json/-j: path of the JSON report to write
+
+[compare options]
+--threshold/-t: percentage of slowdown considered a regression (default = 10)
+
+Example of regression check:
+
+python bit_stream_benchmark.py suite --revision HEAD~1 -j old.json
+python bit_stream_benchmark.py suite -j new.json
+python bit_stream_benchmark.py compare old.json new.json
+'''
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+import zlib
+
+import numpy as np
+
+REPOSITORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LIBRARIES_PATH = os.path.join(REPOSITORY_PATH, "libraries")
+sys.path.insert(0, REPOSITORY_PATH)
+
+from libraries.bit_stream import BitStream, BitReader, HuffmanCodec, RangeCodec, BinaryRangeCodec
+
+
+def generate_data(kind:str, size:int, seed:int=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if kind == "zipf":
+        return (rng.zipf(1.5, size) % 256).astype(np.uint8)
+    if kind == "uniform":
+        return rng.integers(0, 256, size, dtype=np.uint8)
+    if kind == "binary":
+        return (rng.random(size) < 0.05).astype(np.uint8)
+    raise ValueError(f"Unknown data kind '{kind}'")
+
+
+def huffman_compress(data:np.ndarray) -> bytes:
+    bs = BitStream()
+    codec = HuffmanCodec.from_symbols(data)
+    bs.put_bits(len(data), 40)
+    codec.write_header(bs)
+    codec.encode(data, bs)
+    return bs.tobytes()
+
+
+def huffman_decompress(blob:bytes) -> np.ndarray:
+    br = BitReader(blob)
+    count = br.read_bits(40)
+    codec = HuffmanCodec.read_header(br)
+    return codec.decode(br, count).astype(np.uint8)
+
+
+def range_compress(data:np.ndarray) -> bytes:
+    bs = BitStream()
+    binary = bool(data.size) and data.max() <= 1
+    bs.put_bits(len(data), 40)
+    bs.put_bits(binary, 1)
+    codec = BinaryRangeCodec(context_bits=8) if binary else RangeCodec(256)
+    codec.encode(data, bs)
+    return bs.tobytes()
+
+
+def range_decompress(blob:bytes) -> np.ndarray:
+    br = BitReader(blob)
+    count = br.read_bits(40)
+    codec = BinaryRangeCodec(context_bits=8) if br.read_bits(1) else RangeCodec(256)
+    return codec.decode(br, count).astype(np.uint8)
+
+
+def zlib_compress(data:np.ndarray) -> bytes:
+    return zlib.compress(data.tobytes(), 6)
+
+
+def zlib_decompress(blob:bytes) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+
+
+CODECS = {
+    "huffman": (huffman_compress, huffman_decompress),
+    "range": (range_compress, range_decompress),
+    "zlib": (zlib_compress, zlib_decompress),
+}
+
+
+def best_time(function, *args, repeat:int=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_codecs(data:np.ndarray, repeat:int=3) -> list[dict]:
+    results = []
+    for name, (compress, decompress) in CODECS.items():
+        encode_time, blob = best_time(compress, data, repeat=repeat)
+        decode_time, decoded = best_time(decompress, blob, repeat=repeat)
+        if not np.array_equal(decoded, data):
+            raise RuntimeError(f"Codec '{name}' failed the roundtrip")
+        results.append(dict(
+            codec=name,
+            size=len(blob),
+            ratio=len(data) / max(1, len(blob)),
+            encode_mbs=len(data) / 2**20 / encode_time,
+            decode_mbs=len(data) / 2**20 / decode_time))
+    return results
+
+
+def print_results(results:list[dict]) -> None:
+    print(f"{'codec':<10} {'size':>12} {'ratio':>8} {'encode MB/s':>12} {'decode MB/s':>12}")
+    for r in results:
+        print(f"{r['codec']:<10} {r['size']:>12} {r['ratio']:>8.3f} {r['encode_mbs']:>12.2f} {r['decode_mbs']:>12.2f}")
+
+
+def parse_size(size:str) -> int:
+    multipliers = {"K": 2**10, "M": 2**20, "G": 2**30}
+    size = size.strip().upper()
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def format_size(size:int) -> str:
+    for suffix, multiplier in (("G", 2**30), ("M", 2**20), ("K", 2**10)):
+        if size >= multiplier and size % multiplier == 0:
+            return f"{size // multiplier}{suffix}"
+    return str(size)
+
+
+def git_revision(revision:str="HEAD") -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", revision], cwd=LIBRARIES_PATH,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_bit_stream(revision:str=None) -> types.ModuleType:
+    if revision is None:
+        from libraries import bit_stream
+        return bit_stream
+    source = subprocess.run(["git", "show", f"{revision}:./bit_stream.py"], cwd=LIBRARIES_PATH,
+        capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType("bit_stream")
+    exec(compile(source, f"bit_stream.py@{revision}", "exec"), module.__dict__)
+    return module
+
+
+def build_stream(module:types.ModuleType, nbits:int):
+    # uses only put(str) so that it works with every revision
+    bs = module.BitStream()
+    chunk = "0110100110010110" * 256
+    for _ in range(nbits // len(chunk)):
+        bs.put(chunk)
+    if nbits % len(chunk):
+        bs.put(chunk[:nbits % len(chunk)])
+    return bs
+
+
+def run_suite(module:types.ModuleType, sizes:list[int], max_ops:int=200000, repeat:int=3) -> list[dict]:
+    results = []
+
+    def add(case, size, seconds, ops):
+        results.append(dict(case=case, size=size, seconds=seconds,
+            ops_per_s=ops / seconds if seconds > 0 else float('inf'),
+            mb_per_s=size / 2**20 / seconds if seconds > 0 else float('inf')))
+
+    for size in sizes:
+        nbits = 8 * size
+        print(f"Measuring {format_size(size)} streams...", file=sys.stderr)
+
+        # single bits, small ints and strings through putchar
+        ops = min(nbits, max_ops)
+        def put_bits():
+            bs = module.BitStream()
+            for i in range(ops):
+                bs.put(i & 1)
+        add("put_bit", ops // 8, best_time(put_bits, repeat=repeat)[0], ops)
+
+        ops = min(size, max_ops)
+        def put_ints():
+            bs = module.BitStream()
+            for i in range(ops):
+                bs.put(2 + (i & 0x3F))
+        add("put_int", ops, best_time(put_ints, repeat=repeat)[0], ops)
+
+        text = "bit stream benchmark " * 8
+        calls = max(1, min(size, max_ops) // len(text))
+        def putchar_strings():
+            bs = module.BitStream()
+            for _ in range(calls):
+                bs.putchar(text)
+        add("putchar_str", calls * len(text), best_time(putchar_strings, repeat=repeat)[0], calls * len(text))
+
+        # whole stream operations on a stream of the given size (plus some bits to be unaligned)
+        bs = build_stream(module, nbits + 3)
+        add("export", size, best_time(bs.export, repeat=repeat)[0], 1)
+        add("str", size, best_time(bs.__str__, repeat=repeat)[0], 1)
+        add("add", 2 * size, best_time(bs.__add__, bs, repeat=repeat)[0], 1)
+        add("mul", 4 * size, best_time(bs.__mul__, 4, repeat=repeat)[0], 1)
+        del bs
+
+        # memory needed to build and keep the stream
+        tracemalloc.start()
+        bs = build_stream(module, nbits)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del bs
+        results.append(dict(case="memory", size=size,
+            peak_bytes_per_mbit=peak / (nbits / 1e6), kept_bytes_per_mbit=current / (nbits / 1e6)))
+
+    return results
+
+
+def print_suite(results:list[dict]) -> None:
+    print(f"{'case':<12} {'size':>6} {'seconds':>10} {'ops/s':>12} {'MB/s':>10} {'peak B/Mbit':>12}")
+    for r in results:
+        if r["case"] == "memory":
+            print(f"{r['case']:<12} {format_size(r['size']):>6} {'':>10} {'':>12} {'':>10} {r['peak_bytes_per_mbit']:>12.0f}")
+        else:
+            print(f"{r['case']:<12} {format_size(r['size']):>6} {r['seconds']:>10.5f} {r['ops_per_s']:>12.0f} {r['mb_per_s']:>10.2f}")
+
+
+def compare_reports(old:dict, new:dict, threshold:float=10) -> list[str]:
+    """ prints the comparison of two suite reports and returns the list of regressions """
+    def key(r):
+        return (r["case"], r["size"])
+    old_results = {key(r): r for r in old["results"]}
+    regressions = []
+    print(f"old: {old['revision']}  new: {new['revision']}")
+    print(f"{'case':<12} {'size':>6} {'old':>12} {'new':>12} {'change':>9}")
+    for r in new["results"]:
+        if key(r) not in old_results:
+            continue
+        o = old_results[key(r)]
+        # time for the throughput cases and peak memory for the memory case, lower is better
+        metric = "peak_bytes_per_mbit" if r["case"] == "memory" else "seconds"
+        change = 100 * (r[metric] - o[metric]) / o[metric] if o[metric] > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(f"{r['case']} {format_size(r['size'])}")
+        print(f"{r['case']:<12} {format_size(r['size']):>6} {o[metric]:>12.5g} {r[metric]:>12.5g} {change:>+8.1f}%{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="bit_stream_benchmark.py",
+        description="Benchmarks for the bit_stream library (codecs, throughput and memory).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    codecs = commands.add_parser("codecs", help="Benchmark the codecs of the bit_stream library against zlib")
+    codecs.add_argument("--input", "-i", type=str, default=None, help="File to be used as data (default = generated data)")
+    codecs.add_argument("--data", type=str, choices=["zipf", "uniform", "binary"], default="zipf", help="Kind of generated data (default = zipf)")
+    codecs.add_argument("--size", "-s", type=int, default=262144, help="Size in bytes of the generated data (default = 262144)")
+    codecs.add_argument("--repeat", "-r", type=int, default=3, help="Number of runs for each measure, the best one is kept (default = 3)")
+    codecs.add_argument("--seed", type=int, default=0, help="Seed for the generated data (default = 0)")
+
+    suite = commands.add_parser("suite", help="Measure throughput and memory of BitStream")
+    suite.add_argument("--sizes", type=str, default="1K,64K,1M", help="Comma separated stream sizes, with K/M/G suffixes (default = 1K,64K,1M)")
+    suite.add_argument("--max-ops", type=int, default=200000, help="Max number of calls measured by the put cases (default = 200000)")
+    suite.add_argument("--repeat", "-r", type=int, default=3, help="Number of runs for each measure, the best one is kept (default = 3)")
+    suite.add_argument("--revision", type=str, default=None, help="Git revision of bit_stream.py to be measured (default = working tree)")
+    suite.add_argument("--json", "-j", type=str, default=None, help="Path of the JSON report to write")
+
+    compare = commands.add_parser("compare", help="Compare two JSON reports of the suite")
+    compare.add_argument("old", type=str, help="JSON report used as reference")
+    compare.add_argument("new", type=str, help="JSON report to be checked")
+    compare.add_argument("--threshold", "-t", type=float, default=10, help="Percentage of slowdown considered a regression (default = 10)")
+
+    if len(sys.argv) < 2:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.command == "codecs":
+        if args.input is not None:
+            with open(args.input, "rb") as file:
+                data = np.frombuffer(file.read(), dtype=np.uint8)
+            print(f"Data: '{args.input}' ({len(data)} bytes)")
+        else:
+            data = generate_data(args.data, args.size, args.seed)
+            print(f"Data: {args.data} ({len(data)} bytes, seed {args.seed})")
+
+        print_results(run_codecs(data, args.repeat))
+
+    elif args.command == "suite":
+        module = load_bit_stream(args.revision)
+        revision = git_revision(args.revision) if args.revision is not None else git_revision() + " (working tree)"
+        results = run_suite(module, [parse_size(x) for x in args.sizes.split(",")], args.max_ops, args.repeat)
+        print(f"Revision: {revision}")
+        print_suite(results)
+        if args.json is not None:
+            report = dict(revision=revision, python=platform.python_version(), platform=platform.platform(),
+                date=time.strftime("%Y-%m-%d %H:%M:%S"), results=results)
+            with open(args.json, "w") as file:
+                json.dump(report, file, indent=2)
+
+    elif args.command == "compare":
+        with open(args.old) as file:
+            old = json.load(file)
+        with open(args.new) as file:
+            new = json.load(file)
+        regressions = compare_reports(old, new, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -11,12 +11,24 @@ python dir_tree_cloner.py /source/folder /destination/folder [options]
 --placeholders: generate placeholders for every file instead of a file list
 --stats: add stats for each file as a string in file list (or as the content of the placeholder)
 --silent: don't show any output
+--profile [trace.json]: print where the time goes at the end (or write a Chrome trace)
 '''
 
 import sys
 import os
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from libraries import instrumentation
+    from libraries.instrumentation import span, timed
+except ImportError:
+    # the script can be copied alone, then it runs without profiling
+    instrumentation = None
+    timed = lambda function: function
+    from contextlib import nullcontext as span
+
 
 _file_types = dict(
     document = ['pdf', 'odt', 'csv', 'xls', 'xlsx', 'doc', 'docx', 'ppt', 'pptx', 'txt', 'html', 'htm'],
@@ -41,6 +53,7 @@ def getSizeWithMult(size):
     return f"{size} B"
 
 
+@timed
 def getFileStats(file_path):
     name = file_path.split(os.path.sep)[-1]
     try:
@@ -61,6 +74,7 @@ def getFileStats(file_path):
     return f"{name}  [{type} ({extension}); {size}; {m_time} (created {c_time})]"
 
 
+@timed
 def generateFileList(dest_path, orig_path, filenames, stats=True):
     if len(filenames) == 0:
         return
@@ -70,6 +84,7 @@ def generateFileList(dest_path, orig_path, filenames, stats=True):
             line = getFileStats(path) if stats else file
             file_list.write(line+'\n')
 
+@timed
 def generatePlaceholders(dest_path, orig_path, filenames, extensions=True, stats=True):
     if len(filenames) == 0:
         return
@@ -87,6 +102,8 @@ def generatePlaceholders(dest_path, orig_path, filenames, extensions=True, stats
 if __name__ == '__main__':
 
     # TODO: USE ARGPARSE
+    if instrumentation is not None:
+        instrumentation.enable_from_argument(instrumentation.profile_from_argv(sys.argv))
     root = sys.argv[1]
     root_start = len(os.path.sep.join(root.split(os.path.sep)[:-1]))+1
     dest = sys.argv[2]
@@ -101,14 +118,24 @@ if __name__ == '__main__':
     if dest[-1] != os.path.sep:
         dest += os.path.sep
 
-    for (dirpath, dirnames, filenames) in os.walk(root):
+    walker = os.walk(root)
+    while True:
+        with span("os.walk"):
+            entry = next(walker, None)
+        if entry is None:
+            break
+        dirpath, dirnames, filenames = entry
+        if instrumentation is not None:
+            instrumentation.count("directories")
+            instrumentation.count("files", len(filenames))
         if any(substring in dirpath.lower() for substring in ignore_folders):
             print("IGNORED", dirpath)
             continue
         if dirpath[-1] != os.path.sep:
             dirpath += os.path.sep
         dest_path = dest+dirpath[root_start:]
-        os.makedirs(dest_path)
+        with span("makedirs"):
+            os.makedirs(dest_path)
         if not silent:
             print(dirpath)
         if placeholders:
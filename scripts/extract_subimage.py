@@ -6,6 +6,16 @@ import os
 
 from dataclasses import dataclass, field
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from libraries import instrumentation
+    from libraries.instrumentation import timed
+except ImportError:
+    # the script can be copied alone, then it runs without profiling
+    instrumentation = None
+    timed = lambda function: function
+
 show_grid = False
 
 @dataclass
@@ -39,12 +49,14 @@ class Point:
 
 
 
+@timed
 def warpImage(frame:np.ndarray, points:list[Point], width:int, height:int) -> tuple[np.ndarray, np.ndarray]:
     dest_points = np.float32([[0,0], [width, 0], [width, height], [0, height]])
     matrix = cv2.getPerspectiveTransform(np.float32([[pt.x, pt.y] for pt in points]), dest_points)
     img = cv2.warpPerspective(frame, matrix, (width, height))
     return img, matrix
 
+@timed
 def drawGrid(frame:np.ndarray, size:tuple[int, int], grid:tuple[int, int], color:tuple[int], alpha:float, matrix:np.ndarray) -> None:
     
     def lerp(x1:float, y1:float, x2:float, y2:float, t:float) -> list[float, float]:
@@ -269,6 +281,8 @@ if __name__ == "__main__":
     parser.add_argument("--autoclose", action="store_true", help="If present, closes the application after completing the export.")
     parser.add_argument("--grid", type=str, default="20x20", help="Grid divisions for the perspective preview (default = 20x20)")
     parser.add_argument("--process", action="store_true", help="If present, enable processing on the extracted image (currently not implemented).") # TODO: implement image processing with controls
+    if instrumentation is not None:
+        instrumentation.add_profile_argument(parser)
     
 
     if len(sys.argv) < 2:
@@ -276,6 +290,8 @@ if __name__ == "__main__":
         exit(1)
 
     args = parser.parse_args(sys.argv[1:])
+    if instrumentation is not None:
+        instrumentation.enable_from_argument(args.profile, args.profile_sample)
 
     supported_image_formats = ["png", "jpg", "jpeg", "bmp"]
 
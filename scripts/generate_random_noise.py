@@ -4,6 +4,17 @@ import argparse
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from libraries import instrumentation
+    from libraries.instrumentation import span, timed
+except ImportError:
+    # the script can be copied alone, then it runs without profiling
+    instrumentation = None
+    timed = lambda function: function
+    from contextlib import nullcontext as span
+
 # perlin noise implementation adapted from https://stackoverflow.com/a/42154921
 
 def lerp(a, b, x):
@@ -13,12 +24,14 @@ def fade(t):
     # return (3 - 2 * t) * t**2 # Smoothstep: -2t^3 + 3t^2
     return ((6 * t - 15) * t + 10) * t**3 # Smootherstep: 6t^5 + 16t^4 + 10t^3
 
+@timed
 def gradient(h, x, y):
     # converts h to the right gradient vector and return the dot product between x and y
     vectors = np.array([[0, 1], [0, -1], [1, 0], [-1, 0]])
     g = vectors[h % 4]
     return g[:, :, 0] * x + g[:, :, 1] * y
 
+@timed
 def perlin_single_pass(x, y):
     # permutation table
     p = np.arange(256, dtype=int)
@@ -45,6 +58,7 @@ def perlin_single_pass(x, y):
 
     return lerp(x1, x2, v)
 
+@timed
 def perlin(width, height, num_steps:int, attenuation:float=1) -> np.ndarray:
     image = np.zeros((height, width), dtype=float)
     for i in range(num_steps):
@@ -71,7 +85,8 @@ def generate_random(out_file_name:str, width:int, height:int, channels:int, dept
         perl = perlin(width, height, 8, 1.5)
         full_image[:, :, c] = (255 * perl).astype(bit_depths[depth])   
 
-    cv2.imwrite(out_file_name, full_image)
+    with span("imwrite"):
+        cv2.imwrite(out_file_name, full_image)
 
 if __name__ == "__main__":
 
@@ -86,12 +101,16 @@ if __name__ == "__main__":
     parser.add_argument("--channels", type=int, choices=[1, 3, 4], default=3, help="Number of channels to be used (default = 3, like RGB channels)")
     parser.add_argument("--depth", type=int, choices=[1, 8, 16, 32, 64], default=8, help="Bit depth of each channel (default = 8, 8-bit)")
     parser.add_argument("--seed", type=int, default=None, help="Optional seed for the RNG")
+    if instrumentation is not None:
+        instrumentation.add_profile_argument(parser)
 
     if len(sys.argv) < 2:
         parser.print_help()
         exit(1)
 
     args = parser.parse_args(sys.argv[1:])
+    if instrumentation is not None:
+        instrumentation.enable_from_argument(args.profile, args.profile_sample)
 
     supported_image_formats = ["png", "jpg", "jpeg", "bmp", "gif", "tiff", "tif"]
 
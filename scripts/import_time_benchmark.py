@@ -0,0 +1,120 @@
+'''
+import_time_benchmark
+
+Measures how long it takes to import the package `libraries` and each of
+its modules, like `python -X importtime` but with a report per module.
+
+Each import runs in a new interpreter with `-X importtime`, the imports
+already done by the interpreter at startup are discarded and the
+remaining ones are summed. For each module the report shows the median
+and min import time over the runs, the number of modules imported and
+the heaviest dependencies (by cumulative time). Heavy dependencies like
+NumPy and OpenCV are expected to be missing when the modules load them
+lazily.
+
+Usage:
+
+python import_time_benchmark.py [options]
+
+[options]
+--modules/-m: comma separated modules of the package (default = all)
+--repeat/-r: number of runs for each module (default = 5)
+--top/-t: number of heaviest dependencies shown for each module (default = 3)
+--json/-j: path of the JSON report to write
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPOSITORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPOSITORY_PATH)
+
+import libraries
+
+
+def import_times(statement:str) -> list:
+    """
+    Runs a statement in a new interpreter with -X importtime and returns the
+    list of (depth, name, self_us, cumulative_us) of the imports
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=REPOSITORY_PATH,
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure(module:str, repeat:int, startup:set) -> dict:
+    statement = "import " + module
+    totals = []
+    for _ in range(repeat):
+        imports = [i for i in import_times(statement) if i[1] not in startup]
+        # the imports at the lowest depth are the ones done directly by the statement
+        min_depth = min((i[0] for i in imports), default=0)
+        totals.append(sum(i[3] for i in imports if i[0] == min_depth))
+    dependencies = [i for i in imports if i[1] != module and not i[1].startswith("libraries")]
+    heaviest = {}
+    for depth, name, self_us, cumulative_us in dependencies:
+        # a top level package includes its submodules
+        root = name.split(".")[0]
+        if cumulative_us > heaviest.get(root, 0):
+            heaviest[root] = cumulative_us
+    return {
+        "module": module,
+        "median_ms": statistics.median(totals) / 1000,
+        "min_ms": min(totals) / 1000,
+        "modules": len(imports),
+        "heaviest": sorted(heaviest.items(), key=lambda x: -x[1]),
+    }
+
+
+def print_report(results:list, top:int) -> None:
+    width = max(len(r["module"]) for r in results)
+    print(f"{'module':<{width}} {'median ms':>10} {'min ms':>9} {'modules':>8}  heaviest dependencies")
+    for r in results:
+        heaviest = ", ".join(f"{name} {us / 1000:.1f}ms" for name, us in r["heaviest"][:top])
+        print(f"{r['module']:<{width}} {r['median_ms']:>10.2f} {r['min_ms']:>9.2f} {r['modules']:>8}  {heaviest}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="import_time_benchmark.py",
+        description="Measures the import time of the package libraries and of each of its modules.")
+    parser.add_argument("--modules", "-m", type=str, default=None, help="Comma separated modules of the package (default = all)")
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="Number of runs for each module (default = 5)")
+    parser.add_argument("--top", "-t", type=int, default=3, help="Number of heaviest dependencies shown for each module (default = 3)")
+    parser.add_argument("--json", "-j", type=str, default=None, help="Path of the JSON report to write")
+
+    args = parser.parse_args(sys.argv[1:])
+
+    names = libraries._SUBMODULES if args.modules is None else args.modules.split(",")
+    for name in names:
+        if name not in libraries._SUBMODULES:
+            parser.error(f"unknown module '{name}'")
+
+    startup = {i[1] for i in import_times("pass")}
+    results = []
+    for module in ["libraries"] + ["libraries." + name for name in names]:
+        try:
+            results.append(measure(module, args.repeat, startup))
+        except RuntimeError as error:
+            print(f"{module}: import failed ({error})")
+
+    print(f"Python {sys.version.split()[0]}, {args.repeat} runs per module")
+    print_report(results, args.top)
+
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, file, indent=2)
+        print(f"Report written to '{args.json}'")
@@ -0,0 +1,123 @@
+'''
+overlay_benchmark
+
+Benchmarks the alpha compositing of `image_utilities`: draws many sprites
+with random positions (partially outside the canvas too) and alpha on a
+canvas and compares, in ms per frame:
+
+- float: the old float64 blend (`alpha * overlay + (1 - alpha) * crop`)
+- overlay: `overlay_image_alpha` called for each sprite (fixed-point)
+- composite: `composite` with precomputed `Sprite`s, in a single pass
+
+The max difference from the exact (rounded) float blend is reported too.
+
+Usage:
+
+python overlay_benchmark.py [options]
+
+[options]
+--sprites/-n: number of sprites per frame (default = 300)
+--size/-s: side of the square sprites (default = 64)
+--canvas/-c: canvas size WxH (default = 1920x1080)
+--frames/-f: number of frames for each method (default = 20)
+--seed: seed of the random generator (default = 0)
+'''
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from libraries.image_utilities import overlay_image_alpha, Sprite, composite
+
+
+def float_overlay_image_alpha(img, img_overlay, x, y, alpha_mask):
+    """
+    The float blend used by overlay_image_alpha before the fixed-point one
+    """
+    y1, y2 = max(0, y), min(img.shape[0], y + img_overlay.shape[0])
+    x1, x2 = max(0, x), min(img.shape[1], x + img_overlay.shape[1])
+    if y1 >= y2 or x1 >= x2:
+        return
+    img_crop = img[y1:y2, x1:x2]
+    img_overlay_crop = img_overlay[y1 - y:y2 - y, x1 - x:x2 - x]
+    alpha = alpha_mask[y1 - y:y2 - y, x1 - x:x2 - x]
+    img_crop[:] = alpha * img_overlay_crop + (1.0 - alpha) * img_crop
+
+
+def exact_blend(canvas, sprites, placements):
+    canvas = canvas.astype(np.float64)
+    for index, x, y in placements:
+        image, alpha = sprites[index]
+        y1, y2 = max(0, y), min(canvas.shape[0], y + image.shape[0])
+        x1, x2 = max(0, x), min(canvas.shape[1], x + image.shape[1])
+        if y1 >= y2 or x1 >= x2:
+            continue
+        crop = canvas[y1:y2, x1:x2]
+        a = alpha[y1 - y:y2 - y, x1 - x:x2 - x]
+        # rounded after each blend, like a uint8 canvas would be
+        crop[:] = np.rint(a * image[y1 - y:y2 - y, x1 - x:x2 - x] + (1.0 - a) * crop)
+    return canvas
+
+
+def run(name, method, canvas, frames):
+    result = canvas.copy()
+    method(result)
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame = canvas.copy()
+        method(frame)
+    elapsed = (time.perf_counter() - start) / frames
+    return name, elapsed, result
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="overlay_benchmark.py",
+        description="Benchmarks overlay_image_alpha and composite against the float alpha blend.")
+    parser.add_argument("--sprites", "-n", type=int, default=300, help="Number of sprites per frame (default = 300)")
+    parser.add_argument("--size", "-s", type=int, default=64, help="Side of the square sprites (default = 64)")
+    parser.add_argument("--canvas", "-c", type=str, default="1920x1080", help="Canvas size WxH (default = 1920x1080)")
+    parser.add_argument("--frames", "-f", type=int, default=20, help="Number of frames for each method (default = 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator (default = 0)")
+
+    args = parser.parse_args(sys.argv[1:])
+
+    try:
+        width, height = (int(v) for v in args.canvas.lower().split("x"))
+    except ValueError:
+        parser.error(f"invalid canvas size '{args.canvas}', expected WxH")
+
+    rng = np.random.default_rng(args.seed)
+    canvas = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    # a few different sprites, each drawn many times
+    sprites = [(rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8), rng.random((args.size, args.size, 1)))
+               for _ in range(8)]
+    precomputed = [Sprite(image, alpha) for image, alpha in sprites]
+    placements = [(int(rng.integers(len(sprites))), int(rng.integers(-args.size // 2, width - args.size // 2)),
+                   int(rng.integers(-args.size // 2, height - args.size // 2))) for _ in range(args.sprites)]
+
+    def float_method(frame):
+        for index, x, y in placements:
+            float_overlay_image_alpha(frame, sprites[index][0], x, y, sprites[index][1])
+
+    def overlay_method(frame):
+        for index, x, y in placements:
+            overlay_image_alpha(frame, sprites[index][0], x, y, sprites[index][1])
+
+    def composite_method(frame):
+        composite(frame, [(precomputed[index], x, y) for index, x, y in placements])
+
+    exact = exact_blend(canvas, sprites, placements)
+    results = [run(name, method, canvas, args.frames) for name, method in
+               (("float", float_method), ("overlay", overlay_method), ("composite", composite_method))]
+
+    print(f"{args.sprites} sprites {args.size}x{args.size} on {width}x{height}, {args.frames} frames")
+    print(f"{'method':<10} {'ms/frame':>9} {'speedup':>8} {'max diff':>9}")
+    baseline = results[0][1]
+    for name, elapsed, result in results:
+        print(f"{name:<10} {elapsed * 1e3:>9.2f} {baseline / elapsed:>7.2f}x {int(np.abs(result - exact).max()):>9}")
@@ -5,6 +5,17 @@ import psutil
 import numpy as np
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from libraries import instrumentation
+    from libraries.instrumentation import span, timed
+except ImportError:
+    # the script can be copied alone, then it runs without profiling
+    instrumentation = None
+    timed = lambda function: function
+    from contextlib import nullcontext as span
+
 KEY_LEFT = 2424832
 KEY_RIGHT = 2555904
 
@@ -22,6 +33,7 @@ def update_array(array, start, stop,  direction, status):
         else:
             break
 
+@timed
 def generate_timeline(binary_select, binary_class, index, frame_width):
     timeline = np.zeros((50, len(binary_select) + 20, 3), dtype=np.uint8)
     timeline[10:-10, index+10] = (255,255,255)
@@ -35,6 +47,7 @@ def update_left(array, start, status):
 def update_right(array, start, status):
     update_array(array, start, len(array), 1, status)
 
+@timed
 def export_images(frames, binary_select, binary_class, name, path_false, path_true, opt_png_compression):
     if not os.path.exists(path_false):
         os.makedirs(path_false)
@@ -60,7 +73,8 @@ def export_images(frames, binary_select, binary_class, name, path_false, path_tr
             false_count += 1
             out_path = path_false
 
-        cv2.imwrite(os.path.join(out_path, file_name), frames[i], params)
+        with span("imwrite"):
+            cv2.imwrite(os.path.join(out_path, file_name), frames[i], params)
 
     print(f"\nExported {true_count} TRUE and {false_count} FALSE.")
 
@@ -87,12 +101,16 @@ if __name__ == "__main__":
     parser.add_argument("--true_out", "-t", type=str, default='./true', help="Path to export TRUE classified images")
     parser.add_argument("--png", type=int, default=-1, help="If present save images as PNG with the specified compression, else use JPEG")
     parser.add_argument("--autoclose", action="store_true", help="If present, closes the application after completing the export.")
+    if instrumentation is not None:
+        instrumentation.add_profile_argument(parser)
 
     if len(sys.argv) < 2:
         parser.print_help()
         sys.exit(1)
 
     args = parser.parse_args(sys.argv[1:])
+    if instrumentation is not None:
+        instrumentation.enable_from_argument(args.profile, args.profile_sample)
 
     input_path = args.input
     path_true = args.true_out
@@ -127,7 +145,8 @@ if __name__ == "__main__":
         total_frames_n = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
         frame_available = True
         while frame_available:
-            frame_available, frame = capture.read()
+            with span("capture.read"):
+                frame_available, frame = capture.read()
             if frame_available:
                 #if len(frame.shape) > 2:
                 #    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
@@ -160,7 +179,8 @@ if __name__ == "__main__":
 
             composed = np.vstack((temp_frame, timeline))
 
-            cv2.imshow(f"{origin}", composed)
+            with span("imshow"):
+                cv2.imshow(f"{origin}", composed)
 
 
             k = cv2.waitKeyEx(0)